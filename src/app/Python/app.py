@@ -1,394 +1,316 @@
-from flask import Flask
+from flask import Flask, Response, request, jsonify
 from flask_socketio import SocketIO, emit
 from flask_cors import CORS
-import cv2
-import numpy as np
-import base64
 import threading
 import queue
 import time
 import os
-import mediapipe as mp
-import mysql.connector
 
-import posefunctions
+import frametransport
+import inference
+import metrics
+import pipelineconfig
+from posecache import ReferencePoseCache, catalog_exercises
+from posesession import PoseSession
+from sessionrecord import SessionRecorder
+from exercisestate import ExerciseStateMachine, create_pool, ensure_schema, POLL_INTERVAL
 
 app = Flask(__name__)
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
-# Global queue and state
-frame_queue = queue.Queue(maxsize=2)
+# Global state
 processing_active = True
-client_sid = None
 
-
-# Execute query
-# cursor.execute("SELECT * FROM exercises")
-
-# Initialize MediaPipe Pose
-mp_pose = mp.solutions.pose
-mp_drawing = mp.solutions.drawing_utils
-pose = mp_pose.Pose(
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
+# One PoseSession per connected client, keyed by Socket.IO sid
+sessions = {}
+sessions_lock = threading.Lock()
+
+# Sessions with queued frames, waiting for a worker
+ready_sessions = queue.Queue()
+
+# 'staged': each session runs its own decode -> analyze -> render pipeline, so
+# decoding the next frame and encoding the previous one overlap with inference;
+# 'pool': shared worker threads run each frame start to finish
+PROCESSING_MODE = 'staged'
+# Threads for the stateless stages of each session's pipeline (analyze is always 1)
+STAGE_THREADS = {'decode_threads': 1, 'render_threads': 1}
+# Results waiting at each hand-off between stages (a session's input is
+# always a single latest-frame slot)
+STAGE_BUFFER_SIZE = 2
+
+# Flow control: frames a client may have in flight (sent but not yet answered
+# by a processed_frame). Sent to the client on connect; every processed_frame
+# acks the client's frame seq, so clients upload only as fast as we process
+FRAME_WINDOW = 2
+
+# Frames older than this (seconds since capture, when the client sends
+# captured_at; since arrival otherwise) are dropped before decoding.
+# None processes every frame however late
+MAX_FRAME_AGE = 0.25
+
+# Worker threads shared by all sessions (pool mode)
+NUM_WORKERS = os.cpu_count() or 1
+
+# Where decode + pose inference run: 'thread' (in the worker threads) or
+# 'process' (a pool of worker processes, each with its own Pose trackers)
+INFERENCE_BACKEND = 'thread'
+NUM_INFERENCE_PROCESSES = os.cpu_count() or 1
+backend = None
+
+# Model complexity, thresholds and inference size for this deployment
+# (JSON file in $POSE_PIPELINE_CONFIG); clients can override it per session
+PIPELINE_CONFIG = pipelineconfig.load_config()
+# If set, benchmark the models at startup and use the heaviest reaching this fps
+AUTO_SELECT_FPS = None
 
 # Get module directory and load saved pose
 module_path = os.path.abspath(__file__)
 module_directory = os.path.dirname(module_path)
 
+# Reference landmarks are extracted once per pose image and reused. Built at
+# startup, once AUTO_SELECT_FPS has settled PIPELINE_CONFIG
+pose_cache = None
 
-def get_saved_pose(file_name):
-    saved_pose_path = os.path.join(module_directory, 'std_poses', file_name)
-
-    # Load the saved pose image and get landmarks
-    saved_results = None
-    if os.path.exists(saved_pose_path):
-        saved_image = cv2.imread(saved_pose_path)
-        if saved_image is not None:
-            saved_rgb = cv2.cvtColor(saved_image, cv2.COLOR_BGR2RGB)
-            saved_results = pose.process(saved_rgb)
-            if saved_results.pose_landmarks:
-                pass
-                # print("✓ Saved pose loaded successfully!")
-            else:
-                print("⚠️  Warning: No pose detected in saved image")
-        else:
-            print(f"⚠️  Warning: Could not load saved pose from {saved_pose_path}")
-    else:
-        print(f"⚠️  Warning: Saved pose file not found at {saved_pose_path}")
-    
-    return saved_results
+# Active exercise and status, shared by all sessions. Built at startup, not
+# on import: the pool connects right away and process workers re-import this module
+exercises = None
 
+# Score every frame against all catalog poses and report the best match
+RECOGNIZE_EXERCISES = False
+catalog_names, catalog_stack = [], None
 
-def continuous_processing_loop():
-    """
-    Main processing loop that runs continuously.
-    Waits for frames from the queue and processes them with MediaPipe.
-    """
+# Record every session's incoming frames and results for replaySession.py
+RECORD_SESSIONS = False
+RECORDINGS_DIR = os.path.join(module_directory, 'recordings')
 
-    # Offset and scale for saved pose overlay
-    offset_x = 0.0
-    offset_y = 0.0
-    scale = 1.0
+# Default for sending per-stage timings in processed_frame (clients can
+# switch it per session with set_response_mode)
+SEND_TIMING = False
 
-    #x_offsets = np.array([])
-    #y_offsets = np.array([])
-    #scales = np.array([])
 
-    posefile = 't_pose.jpg'
-    saved_results = get_saved_pose('t_pose.jpg')
-    pose_loaded = False
-    
-    #while not saved_results.pose_landmarks:
-    #    saved_results = get_saved_pose('t_pose.jpg')
+def get_session(sid):
+    with sessions_lock:
+        return sessions.get(sid)
 
-    
-    cal_done_time = time.time()
 
-    scores = np.array([])
+def schedule_session(session):
+    """Hand a session to the worker pool unless a worker already has it"""
+    with session.schedule_lock:
+        if session.scheduled or not session.active:
+            return
+        session.scheduled = True
+    ready_sessions.put(session)
 
-    global processing_active, client_sid
-    
-    print("🔄 Starting continuous pose processing loop...")
-    num_frames = -1
+
+def emit_processed_frame(session, response, timer):
+    with timer.span('emit'):
+        socketio.emit('processed_frame', response, room=session.sid)
+    metrics.registry.observe_timer(timer)
+    metrics.registry.increment('frames_processed')
+
+
+def emit_pipeline_output(session, job):
+    """Output of a session's staged pipeline, called in frame order"""
+    emit_processed_frame(session, job['response'], job['timer'])
+
+
+def emit_frame_dropped(session, frame_data, reason):
+    """
+    Tell the client a frame won't be answered ('stale', 'superseded',
+    'decode_failed', 'too_large', 'error' or 'closed'), so its credit comes back
+    """
+    message = {'reason': reason, 'age_ms': round(session.frame_age(frame_data) * 1000.0, 3)}
+    if frame_data.get('seq') is not None:
+        message['ack'] = frame_data['seq']
+    socketio.emit('frame_dropped', message, room=session.sid)
+
+
+def processing_worker():
+    """
+    Worker loop shared by all sessions.
+    Takes a session with pending frames, processes one frame and reschedules
+    the session if more are waiting, so busy clients are served round-robin.
+    """
     while processing_active:
         try:
-            # print(scale)
-            # initialize database
-            if num_frames % 5 == 0 or num_frames == -1:
-                connection = mysql.connector.connect(
-                    host='localhost',      # or your server IP
-                    user='sql',
-                    password='knighthacks',
-                    database='yogavision',
-                    port=3306        
-                     # default MariaDB port
-                )
-                # num_frames = 0s
-
-            cursor = connection.cursor(dictionary=True, buffered=True)
-            cursor.execute("SELECT * FROM exercises WHERE status IN (1)")
-            stat1_rows = cursor.fetchall()
-            if len(stat1_rows) >= 1:
-                # print(table_rows)
-                exercise_id = stat1_rows[0]['id']
-                exercise = stat1_rows[0]['exercise']
-                category = stat1_rows[0]['category']
-                status = stat1_rows[0]['status']
-                # print(status)
-                #if len(stat1_rows) > 1:
-                #    print("More than 1 exercise of status 1")
-            
-            cursor.execute("SELECT * FROM exercises WHERE status IN (2)")
-            stat2_rows = cursor.fetchall()
-            if len(stat2_rows) >= 1:
-                # print(table_rows)
-                exercise_id = stat2_rows[0]['id']
-                exercise = stat2_rows[0]['exercise']
-                category = stat2_rows[0]['category']
-                status = stat2_rows[0]['status']
-                # print(status)
-                if len(stat2_rows) > 1:
-                    print("More than 1 exercise of status 1")
-
-
-            posefile = f'{exercise}_pose.jpg'
-            
-            if num_frames % 30 == 0:
-                print(f"status: {status}, excercise:{exercise}, file:{posefile}")
-
-            if not pose_loaded:
-                saved_results = get_saved_pose(posefile)
-                while not saved_results.pose_landmarks:
-                    print("Searching for Pose")
-                    saved_results = get_saved_pose(posefile)
-                pose_loaded = True
-
-            # Wait for a frame from the queue
-            frame_data = frame_queue.get(timeout=1.0)
-            
-            if frame_data is None:
-                continue
-            
-            # Decode the frame
-            image_data = frame_data['image'].split(',')[1]
-            img_bytes = base64.b64decode(image_data)
-            nparr = np.frombuffer(img_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                print("⚠️ Failed to decode image")
-                continue
-            
-            
-
-            # ====================================
-            # MEDIAPIPE POSE PROCESSING
-            # ====================================
-            
-            # Convert to RGB for MediaPipe
-            rgb_frame = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
-            # Process live frame with MediaPipe
-            live_results = pose.process(rgb_frame)
-            
-            # Create display frame
-            display_frame = img.copy()
-            
-            # calibration
-            if status == 1:
-                saved_results = get_saved_pose(posefile)
-            
-            # Draw SAVED pose landmarks (in RED) with offset and scale
-            if saved_results and saved_results.pose_landmarks:
-                # Create adjusted landmarks with offset and scale
-                landmark_list = []
-                for landmark in saved_results.pose_landmarks.landmark:
-                    adjusted_landmark = type(landmark)()
-                    adjusted_landmark.x = (landmark.x - 0.5) * scale + 0.5 + offset_x
-                    adjusted_landmark.y = (landmark.y - 0.5) * scale + 0.5 + offset_y
-                    adjusted_landmark.z = landmark.z * scale
-                    adjusted_landmark.visibility = landmark.visibility
-                    landmark_list.append(adjusted_landmark)
-                
-                adjusted_pose = type(saved_results.pose_landmarks)()
-                adjusted_pose.landmark.extend(landmark_list)
-                
-                # Draw saved pose in RED
-                mp_drawing.draw_landmarks(
-                    display_frame,
-                    adjusted_pose,
-                    mp_pose.POSE_CONNECTIONS,
-                    mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2),
-                    mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2)
-                )
-            
-            # Draw LIVE pose landmarks (in GREEN)
-            if live_results.pose_landmarks:
-                mp_drawing.draw_landmarks(
-                    display_frame,
-                    live_results.pose_landmarks,
-                    mp_pose.POSE_CONNECTIONS,
-                    mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-                    mp_drawing.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2)
-                )
-            
-            # Calculate accuracy score
-            accuracy = 0.0
-            if saved_results and saved_results.pose_landmarks and live_results.pose_landmarks:
-                # Create adjusted landmarks for comparison
-                landmark_list = []
-                for landmark in saved_results.pose_landmarks.landmark:
-                    adjusted_landmark = type(landmark)()
-                    adjusted_landmark.x = (landmark.x - 0.5) * scale + 0.5 + offset_x
-                    adjusted_landmark.y = (landmark.y - 0.5) * scale + 0.5 + offset_y
-                    adjusted_landmark.z = landmark.z * scale
-                    adjusted_landmark.visibility = landmark.visibility
-                    landmark_list.append(adjusted_landmark)
-                
-                adjusted_pose = type(saved_results.pose_landmarks)()
-                adjusted_pose.landmark.extend(landmark_list)
-                
-                # Calculate similarity
-                accuracy = posefunctions.calculate_pose_similarity_wo_face(adjusted_pose, live_results.pose_landmarks)
-
-                if accuracy >= 80 and status == 1:
-                    print("status update: 2")
-                    cursor.execute(
-                        "UPDATE exercises SET status = %s WHERE id = %s",
-                        (str(2), exercise_id)
-                    )
-                    connection.commit()
-                    cal_done_time = time.time()
-                    pose_loaded = True
-                if status == 2:
-                    scores = np.append(scores, accuracy)
-                    if accuracy < 80:
-                        cal_done_time = time.time()
-                    elif time.time() - cal_done_time >= 10:
-                        print("status update: 3")
-                        cursor.execute(
-                            "UPDATE exercises SET status = %s WHERE id = %s",
-                        (str(3), exercise_id)
-                        )
-                        connection.commit()
-                        
-                        cursor.execute(
-                            "UPDATE exercises SET score = %s WHERE id = %s",
-                        (str(np.mean(scores)), exercise_id)
-                        )
-                        connection.commit()
-                        scores = np.array([])
-                        time.sleep(2)
-                        pose_loaded = False
-
-
-
-                # Display accuracy with color coding
-                if accuracy >= 80:
-                    color = (0, 255, 0)  # Green
-                elif accuracy >= 60:
-                    color = (0, 255, 255)  # Yellow
-                else:
-                    color = (0, 0, 255)  # Red
-                
-                cv2.putText(display_frame, f"Match: {accuracy:.1f}%", (10, 30),
-                           cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 3)
-            
-            num_frames += 1
-            if num_frames > 99:
-                num_frames = 0
-            cursor.close()
-            # ====================================
-            # END PROCESSING
-            # ====================================
-            
-            # Encode processed frame
-            encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 70]
-            _, buffer = cv2.imencode('.jpg', img=display_frame, params=encode_param)
-            processed_base64 = base64.b64encode(buffer).decode('utf-8')
-            
-            # Send back to client with accuracy score
-            if client_sid:
-                socketio.emit('processed_frame', {
-                    'image': f'data:image/jpeg;base64,{processed_base64}',
-                    'accuracy': accuracy
-                }, room=client_sid)
-            
-            frame_queue.task_done()
-            
+            session = ready_sessions.get(timeout=1.0)
         except queue.Empty:
             continue
+
+        try:
+            response = session.process_next()
+            if response is not None:
+                emit_processed_frame(session, response, session.last_timer)
         except Exception as e:
-            print(f"❌ Error in processing loop: {str(e)}")
+            print(f"❌ Error processing frame for {session.sid}: {str(e)}")
             import traceback
             traceback.print_exc()
-            time.sleep(0.1)
-    
-    print("🛑 Processing loop stopped")
+        finally:
+            with session.schedule_lock:
+                session.scheduled = False
+            if session.has_frames():
+                schedule_session(session)
+
+    print("🛑 Processing worker stopped")
+
+def exercise_poll_loop():
+    """Fallback reload of the active exercise in case a change notification was missed"""
+    while processing_active:
+        try:
+            exercises.poll()
+        except Exception as e:
+            print(f"❌ Error polling exercises: {str(e)}")
+        time.sleep(POLL_INTERVAL)
+
+
+@app.route('/exercises/changed', methods=['POST'])
+def exercises_changed():
+    """Called by the Next.js updateExercises route after it changes the exercises table"""
+    current = exercises.notify_changed()
+    return jsonify({'exercise': current.exercise, 'status': current.status})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Counters and per-stage latency summaries; ?format=prometheus for scrapers"""
+    if request.args.get('format') == 'prometheus':
+        return Response(metrics.registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    snapshot = metrics.registry.snapshot()
+    with sessions_lock:
+        snapshot['sessions'] = len(sessions)
+    snapshot['db_pending'] = exercises.writer.pending()
+    return jsonify(snapshot)
+
 
 @socketio.on('frame')
 def handle_frame(data):
-    """Receive frames from frontend and add to queue"""
-    global frame_queue
+    """Receive frames ({image, seq, captured_at}) from frontend and hand them to the client's session"""
+    session = get_session(request.sid)
+    if session is None:
+        return
+    
+    # Clients may emit the raw JPEG/WebP bytes directly
+    if frametransport.is_binary(data):
+        data = {'image': data}
     
     try:
-        if frame_queue.full():
-            try:
-                frame_queue.get_nowait()
-            except queue.Empty:
-                pass
-        
-        frame_queue.put(data, block=False)
-        
-    except queue.Full:
-        pass
+        session.submit(data)
+        if session.pipeline is None:
+            schedule_session(session)
     except Exception as e:
         print(f"❌ Error queuing frame: {str(e)}")
 
 @socketio.on('adjust_pose')
 def handle_adjust_pose(data):
     """Handle pose adjustment controls from frontend"""
-    global offset_x, offset_y, scale
+    session = get_session(request.sid)
+    if session is None:
+        return
     
-    action = data.get('action')
+    emit('pose_adjusted', session.adjust(data.get('action')))
+
+@socketio.on('set_response_mode')
+def handle_set_response_mode(data):
+    """Switch processed_frame between annotated images and landmarks only"""
+    session = get_session(request.sid)
+    if session is None:
+        return
     
-    if action == 'move_up':
-        offset_y -= 0.01
-    elif action == 'move_down':
-        offset_y += 0.01
-    elif action == 'move_left':
-        offset_x -= 0.01
-    elif action == 'move_right':
-        offset_x += 0.01
-    elif action == 'scale_up':
-        scale += 0.05
-    elif action == 'scale_down':
-        scale = max(0.1, scale - 0.05)
-    elif action == 'reset':
-        offset_x = 0.0
-        offset_y = 0.0
-        scale = 1.0
+    mode = data.get('mode')
+    if mode in ('image', 'landmarks'):
+        session.response_mode = mode
+    if 'timing' in data:
+        session.send_timing = bool(data['timing'])
     
-    emit('pose_adjusted', {'offset_x': offset_x, 'offset_y': offset_y, 'scale': scale})
+    emit('response_mode', {'mode': session.response_mode, 'timing': session.send_timing})
+
+@socketio.on('set_pipeline')
+def handle_set_pipeline(data):
+    """Override model complexity, thresholds or inference size for this client"""
+    session = get_session(request.sid)
+    if session is None:
+        return
+    
+    try:
+        config = pipelineconfig.config_from_dict(data or {}, base=session.pipeline_config)
+    except (TypeError, ValueError) as e:
+        emit('error', {'message': str(e)})
+        return
+    
+    session.configure(config)
+    emit('pipeline', config._asdict())
 
 @socketio.on('connect')
 def handle_connect():
-    global client_sid
-    from flask import request
-    client_sid = request.sid
-    print(f'✅ Client connected: {client_sid}')
+    recorder = None
+    if RECORD_SESSIONS:
+        recording = os.path.join(RECORDINGS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{request.sid}")
+        recorder = SessionRecorder(recording, source=request.sid)
+        print(f"⏺  Recording session to {recording}")
+
+    session = PoseSession(request.sid, backend, pose_cache, exercises, catalog_names, catalog_stack,
+                          recorder=recorder, send_timing=SEND_TIMING,
+                          max_frame_age=MAX_FRAME_AGE, on_dropped=emit_frame_dropped)
+    if PROCESSING_MODE == 'staged':
+        session.start_pipeline(emit_pipeline_output, buffer_size=STAGE_BUFFER_SIZE, **STAGE_THREADS)
+    with sessions_lock:
+        sessions[request.sid] = session
+    print(f'✅ Client connected: {request.sid} ({len(sessions)} active)')
     emit('status', {'message': 'Connected to pose processing server'})
+    emit('flow_control', {'window': FRAME_WINDOW})
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    global client_sid
-    from flask import request
     print(f'❌ Client disconnected: {request.sid}')
-    if client_sid == request.sid:
-        client_sid = None
+    with sessions_lock:
+        session = sessions.pop(request.sid, None)
     
-    while not frame_queue.empty():
-        try:
-            frame_queue.get_nowait()
-        except queue.Empty:
-            break
+    if session is not None:
+        session.close()
 
 if __name__ == '__main__':
     print("=" * 50)
     print("🚀 Starting Flask-SocketIO Pose Comparison Server...")
     print("=" * 50)
     
-    # Start the continuous processing thread
-    processing_thread = threading.Thread(
-        target=continuous_processing_loop, 
-        daemon=True,
-        name="PoseProcessingThread"
+    exercises = ExerciseStateMachine(create_pool())
+    ensure_schema(exercises.pool)
+    exercises.reload()
+    threading.Thread(target=exercise_poll_loop, daemon=True, name="ExercisePollThread").start()
+    
+    if AUTO_SELECT_FPS:
+        print(f"Selecting a model for {AUTO_SELECT_FPS} fps...")
+        PIPELINE_CONFIG = pipelineconfig.auto_select(AUTO_SELECT_FPS, PIPELINE_CONFIG)
+    
+    # References must come from the same model the sessions run
+    pose_cache = ReferencePoseCache(
+        pose_dir=os.path.join(module_directory, 'std_poses'),
+        cache_dir=os.path.join(module_directory, 'pose_cache'),
+        config=PIPELINE_CONFIG
     )
-    processing_thread.start()
-    print("✓ Processing thread started")
+    
+    if RECOGNIZE_EXERCISES:
+        catalog_names, catalog_stack = pose_cache.get_stack(catalog_exercises())
+        print(f"✓ Loaded {len(catalog_names)} reference poses for recognition")
+    
+    backend = inference.create_backend(INFERENCE_BACKEND, NUM_INFERENCE_PROCESSES, PIPELINE_CONFIG)
+    print(f"✓ Inference backend: {INFERENCE_BACKEND}, model: {PIPELINE_CONFIG.model}")
+    
+    if PROCESSING_MODE == 'staged':
+        print(f"✓ Staged processing: {STAGE_THREADS['decode_threads']} decode, 1 analyze, "
+              f"{STAGE_THREADS['render_threads']} render thread(s) per session")
+    else:
+        # Start the shared processing workers
+        for i in range(NUM_WORKERS):
+            processing_thread = threading.Thread(
+                target=processing_worker,
+                daemon=True,
+                name=f"PoseProcessingThread-{i}"
+            )
+            processing_thread.start()
+        print(f"✓ {NUM_WORKERS} processing threads started")
     
     # Start the Flask-SocketIO server on HTTP (no SSL)
     print("✓ Listening on http://0.0.0.0:5000")
@@ -400,5 +322,11 @@ if __name__ == '__main__':
         socketio.run(app, host='0.0.0.0', port=5000, debug=True, allow_unsafe_werkzeug=True)
     finally:
         processing_active = False
-        pose.close()
+        with sessions_lock:
+            for session in sessions.values():
+                session.close()
+            sessions.clear()
+        backend.close()
+        exercises.writer.flush(timeout=2.0)
+        pose_cache.close()
         print("🛑 Shutting down...")
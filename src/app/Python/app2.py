@@ -12,6 +12,8 @@ import mediapipe as mp
 import mysql.connector
 
 import posefunctions
+import pipelineconfig
+from posecache import ReferencePoseCache
 
 app = Flask(__name__)
 CORS(app)
@@ -33,37 +35,25 @@ scale = 1.0
 # Initialize MediaPipe Pose
 mp_pose = mp.solutions.pose
 mp_drawing = mp.solutions.drawing_utils
-pose = mp_pose.Pose(
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
+# Same deployment config as app.py, so references and live poses match
+pipeline_config = pipelineconfig.load_config()
+pose = pipelineconfig.create_pose(pipeline_config)
 
 # Get module directory and load saved pose
 module_path = os.path.abspath(__file__)
 module_directory = os.path.dirname(module_path)
 
+# Reference landmarks are extracted once per pose image and reused
+pose_cache = ReferencePoseCache(
+    pose_dir=os.path.join(module_directory, 'std_poses'),
+    cache_dir=os.path.join(module_directory, 'pose_cache'),
+    config=pipeline_config
+)
 
-def get_saved_pose(file_name):
-    saved_pose_path = os.path.join(module_directory, 'std_poses', file_name)
 
-    # Load the saved pose image and get landmarks
-    saved_results = None
-    if os.path.exists(saved_pose_path):
-        saved_image = cv2.imread(saved_pose_path)
-        if saved_image is not None:
-            saved_rgb = cv2.cvtColor(saved_image, cv2.COLOR_BGR2RGB)
-            saved_results = pose.process(saved_rgb)
-            if saved_results.pose_landmarks:
-                pass
-                # print("✓ Saved pose loaded successfully!")
-            else:
-                print("⚠️  Warning: No pose detected in saved image")
-        else:
-            print(f"⚠️  Warning: Could not load saved pose from {saved_pose_path}")
-    else:
-        print(f"⚠️  Warning: Saved pose file not found at {saved_pose_path}")
-    
-    return saved_results
+def get_saved_pose(file_name):
+    """Return the cached (33, 4) reference landmark array for a std_poses image"""
+    return pose_cache.get(file_name)
 
 
 def continuous_processing_loop():
@@ -78,12 +68,9 @@ def continuous_processing_loop():
     scales = np.array([])
 
     posefile = 't_pose.jpg'
-    saved_results = get_saved_pose('t_pose.jpg')
+    saved_array = get_saved_pose(posefile)
     pose_loaded = False
     
-    #while not saved_results.pose_landmarks:
-    #    saved_results = get_saved_pose('t_pose.jpg')
-
     scores = np.array([])
     cal_done_time = time.time()
     
@@ -136,11 +123,10 @@ def continuous_processing_loop():
                 print(f"status: {status}, excercise:{exercise}, file:{posefile}")
 
             if not pose_loaded:
-                saved_results = get_saved_pose(posefile)
-                while not saved_results.pose_landmarks:
-                    print("Searching for Pose")
-                    saved_results = get_saved_pose(posefile)
-                pose_loaded = True
+                saved_array = get_saved_pose(posefile)
+                # Missing or undetectable pose images are retried on the
+                # next frame instead of spinning here
+                pose_loaded = saved_array is not None
 
             # Wait for a frame from the queue
             frame_data = frame_queue.get(timeout=1.0)
@@ -173,29 +159,19 @@ def continuous_processing_loop():
             # Create display frame
             display_frame = img.copy()
             
-            # calibration
+            # calibration: cheap mtime check so an updated pose image is picked up
             if status == 1:
-                saved_results = get_saved_pose(posefile)
+                saved_array = get_saved_pose(posefile)
+            
+            # Apply offset and scale to the saved pose once per frame
+            adjusted_array = posefunctions.transform_landmarks(saved_array, offset_x, offset_y, scale)
+            live_array = posefunctions.results_to_array(live_results)
             
             # Draw SAVED pose landmarks (in RED) with offset and scale
-            if saved_results and saved_results.pose_landmarks:
-                # Create adjusted landmarks with offset and scale
-                landmark_list = []
-                for landmark in saved_results.pose_landmarks.landmark:
-                    adjusted_landmark = type(landmark)()
-                    adjusted_landmark.x = (landmark.x - 0.5) * scale + 0.5 + offset_x
-                    adjusted_landmark.y = (landmark.y - 0.5) * scale + 0.5 + offset_y
-                    adjusted_landmark.z = landmark.z * scale
-                    adjusted_landmark.visibility = landmark.visibility
-                    landmark_list.append(adjusted_landmark)
-                
-                adjusted_pose = type(saved_results.pose_landmarks)()
-                adjusted_pose.landmark.extend(landmark_list)
-                
-                # Draw saved pose in RED
+            if adjusted_array is not None:
                 mp_drawing.draw_landmarks(
                     display_frame,
-                    adjusted_pose,
+                    posefunctions.array_to_landmarks(adjusted_array),
                     mp_pose.POSE_CONNECTIONS,
                     mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2),
                     mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2)
@@ -213,22 +189,9 @@ def continuous_processing_loop():
             
             # Calculate accuracy score
             accuracy = 0.0
-            if saved_results and saved_results.pose_landmarks and live_results.pose_landmarks:
-                # Create adjusted landmarks for comparison
-                landmark_list = []
-                for landmark in saved_results.pose_landmarks.landmark:
-                    adjusted_landmark = type(landmark)()
-                    adjusted_landmark.x = (landmark.x - 0.5) * scale + 0.5 + offset_x
-                    adjusted_landmark.y = (landmark.y - 0.5) * scale + 0.5 + offset_y
-                    adjusted_landmark.z = landmark.z * scale
-                    adjusted_landmark.visibility = landmark.visibility
-                    landmark_list.append(adjusted_landmark)
-                
-                adjusted_pose = type(saved_results.pose_landmarks)()
-                adjusted_pose.landmark.extend(landmark_list)
-                
+            if adjusted_array is not None and live_array is not None:
                 # Calculate similarity
-                accuracy = posefunctions.calculate_pose_similarity_wo_face(adjusted_pose, live_results.pose_landmarks)
+                accuracy = posefunctions.calculate_pose_similarity_wo_face(adjusted_array, live_array)
                 #if status == 1 and accuracy < 90 and live_results.pose_landmarks:
                    # temp_x, temp_y, temp_scale = posefunctions.calculate_alignment(adjusted_pose, live_results.pose_landmarks)
                     
@@ -411,4 +374,5 @@ if __name__ == '__main__':
     finally:
         processing_active = False
         pose.close()
+        pose_cache.close()
         print("🛑 Shutting down...")
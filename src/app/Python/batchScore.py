@@ -0,0 +1,209 @@
+"""
+Headless batch scoring of recorded videos.
+
+Streams frames from each video, runs MediaPipe pose extraction and scores
+every frame against a reference pose with posefunctions. Per-frame results
+are written as one columnar .npz per video:
+
+    frame      (F,)        frame index
+    timestamp  (F,)        seconds from the start of the video
+    has_pose   (F,)        whether a pose was detected
+    score      (F,)        0-100 similarity (0 when no pose)
+
+The live landmarks go to a .traj trajectory next to it (see trajectory.py).
+Passing .traj files instead of videos re-scores them without MediaPipe.
+
+Usage:
+    python batchScore.py recordings/ --pose "Tree Pose_pose.jpg" --out results/ --workers 4
+    python batchScore.py results/ --pose "Warrior II_pose.jpg" --out rescored/
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+import cv2
+import numpy as np
+
+import posefunctions
+import inference
+import pipelineconfig
+import trajectory
+from posecache import ReferencePoseCache
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm')
+TRAJECTORY_EXTENSION = '.traj'
+
+
+def find_videos(paths):
+    """Expand files and directories into a sorted list of video files"""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(VIDEO_EXTENSIONS + (TRAJECTORY_EXTENSION,)):
+                    videos.append(os.path.join(path, name))
+        else:
+            videos.append(path)
+    return videos
+
+
+def output_path_for(video_path, out_dir):
+    name = os.path.basename(video_path)
+    if name.endswith(TRAJECTORY_EXTENSION):
+        name = name[:-len(TRAJECTORY_EXTENSION)]
+    else:
+        name = os.path.splitext(name)[0]
+    return os.path.join(out_dir, f'{name}.scores.npz')
+
+
+def trajectory_path_for(out_path):
+    return out_path[:-len('.scores.npz')] + TRAJECTORY_EXTENSION
+
+
+def score_frame(reference, live_array, aspect_ratio, auto_align=True):
+    """Score one live frame against the reference, fitting the overlay first if auto_align"""
+    if live_array is None or reference is None:
+        return 0.0
+
+    offset_x, offset_y, scale, rotation = 0.0, 0.0, 1.0, 0.0
+    if auto_align:
+        offset_x, offset_y, scale, rotation = posefunctions.fit_similarity_transform(
+            reference, live_array, aspect_ratio=aspect_ratio
+        )
+    adjusted_array = posefunctions.transform_landmarks(
+        reference, offset_x, offset_y, scale,
+        rotation=rotation, aspect_ratio=aspect_ratio
+    )
+    return posefunctions.calculate_pose_similarity_wo_face(adjusted_array, live_array)
+
+
+def save_scores(out_path, has_pose, scores, fps, source, trajectory_path):
+    frames = len(scores)
+    np.savez_compressed(
+        out_path,
+        frame=np.arange(frames, dtype=np.int32),
+        timestamp=np.arange(frames, dtype=np.float64) / fps,
+        has_pose=np.asarray(has_pose, dtype=bool),
+        score=np.asarray(scores, dtype=np.float32),
+        fps=np.float64(fps),
+        source=np.str_(source),
+        trajectory=np.str_(trajectory_path)
+    )
+
+
+def score_video(video_path, reference, out_path, auto_align=True, config=pipelineconfig.DEFAULT_CONFIG):
+    """Score every frame of one video against the reference landmarks and save the columns"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"⚠️  Warning: Could not open video {video_path}")
+        return None
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    tracker = inference.SessionTracker(config)
+
+    has_pose, scores = [], []
+    trajectory_path = trajectory_path_for(out_path)
+    start = time.time()
+
+    try:
+        with trajectory.TrajectoryWriter(trajectory_path, fps, source=os.path.abspath(video_path),
+                                         width=width, height=height) as writer:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+
+                live_array = tracker.run(frame)
+                writer.append(live_array)
+
+                has_pose.append(live_array is not None)
+                scores.append(score_frame(reference, live_array, frame.shape[1] / frame.shape[0], auto_align))
+    finally:
+        cap.release()
+        tracker.close()
+
+    save_scores(out_path, has_pose, scores, fps, os.path.abspath(video_path), trajectory_path)
+
+    elapsed = time.time() - start
+    print(f"✓ {os.path.basename(video_path)}: {len(scores)} frames in {elapsed:.1f}s "
+          f"({len(scores) / max(elapsed, 1e-6):.1f} fps) -> {out_path}")
+    return out_path
+
+
+def rescore_trajectory(trajectory_path, reference, out_path, auto_align=True):
+    """Score a recorded .traj against the reference without running MediaPipe"""
+    recorded = trajectory.open_trajectory(trajectory_path)
+    width = recorded.metadata.get('width')
+    height = recorded.metadata.get('height')
+    aspect_ratio = width / height if width and height else 1.0
+
+    start = time.time()
+    has_pose, scores = [], []
+    for index in range(len(recorded.landmarks)):
+        live_array = trajectory.frame_array(recorded, index)
+        has_pose.append(live_array is not None)
+        scores.append(score_frame(reference, live_array, aspect_ratio, auto_align))
+
+    save_scores(out_path, has_pose, scores, recorded.fps, recorded.source or '', os.path.abspath(trajectory_path))
+
+    elapsed = time.time() - start
+    print(f"✓ {os.path.basename(trajectory_path)}: re-scored {len(scores)} frames in {elapsed:.1f}s -> {out_path}")
+    return out_path
+
+
+def _score_job(args):
+    video_path, reference, out_path, auto_align, config = args
+    try:
+        if video_path.endswith(TRAJECTORY_EXTENSION):
+            return rescore_trajectory(video_path, reference, out_path, auto_align)
+        return score_video(video_path, reference, out_path, auto_align, config)
+    except Exception as e:
+        print(f"❌ Error scoring {video_path}: {str(e)}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score recorded videos against a reference pose")
+    parser.add_argument('inputs', nargs='+', help="video or .traj files, or directories of them")
+    parser.add_argument('--pose', default='t_pose.jpg', help="reference pose image in std_poses/")
+    parser.add_argument('--out', default='scores', help="output directory")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="parallel processes")
+    parser.add_argument('--no-align', action='store_true', help="score without automatic alignment")
+    parser.add_argument('--model', choices=tuple(pipelineconfig.MODEL_COMPLEXITY), help="MediaPipe model")
+    args = parser.parse_args()
+
+    config = pipelineconfig.load_config()
+    if args.model:
+        config = config._replace(model=args.model)
+
+    reference = ReferencePoseCache(config=config).get(args.pose)
+    if reference is None:
+        print(f"❌ No usable reference pose in {args.pose}")
+        return 1
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("❌ No videos found")
+        return 1
+
+    os.makedirs(args.out, exist_ok=True)
+    jobs = [(video, reference, output_path_for(video, args.out), not args.no_align, config) for video in videos]
+
+    print(f"🚀 Scoring {len(videos)} video(s) with {min(args.workers, len(videos))} process(es)")
+    if args.workers <= 1 or len(videos) == 1:
+        results = [_score_job(job) for job in jobs]
+    else:
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(processes=min(args.workers, len(videos))) as pool:
+            results = pool.map(_score_job, jobs, chunksize=1)
+
+    failed = sum(1 for result in results if result is None)
+    print(f"✓ Done: {len(results) - failed} scored, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
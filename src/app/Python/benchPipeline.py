@@ -0,0 +1,231 @@
+"""
+Per-stage benchmark of the frame pipeline.
+
+Times each stage separately on a fixed input (a std_poses image scaled to
+the camera size) and reports frames/sec and p50/p99 latency. Runs headless
+on CPU. Results can be saved as JSON and compared against an earlier run:
+
+    python benchPipeline.py --json bench-before.json
+    python benchPipeline.py --json bench-after.json --compare bench-before.json
+
+Stages: b64_decode, imdecode, cvtColor, pose_process, adaptive_inference
+(crop + downsample + cvtColor + pose.process), fit_alignment, transform,
+similarity, draw_overlay (cached reference layer), imencode and (with --db) db_round_trip.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import subprocess
+import time
+
+import cv2
+import numpy as np
+
+import posefunctions
+import frametransport
+import inference
+import pipelineconfig
+from posecache import ReferencePoseCache
+from poseoverlay import OverlayRenderer
+
+module_path = os.path.abspath(__file__)
+module_directory = os.path.dirname(module_path)
+
+DEFAULT_IMAGE = os.path.join(module_directory, 'std_poses', 't_pose.jpg')
+DEFAULT_REFERENCE = 'Tree Pose_pose.jpg'
+
+
+def time_stage(func, iterations, warmup):
+    """Run func warmup + iterations times; returns per-call durations in seconds"""
+    for _ in range(warmup):
+        func()
+
+    durations = np.empty(iterations, dtype=np.float64)
+    for i in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations[i] = time.perf_counter() - start
+    return durations
+
+
+def summarize(durations):
+    durations_ms = durations * 1000.0
+    mean = float(durations_ms.mean())
+    return {
+        'iterations': int(len(durations_ms)),
+        'mean_ms': round(mean, 3),
+        'p50_ms': round(float(np.percentile(durations_ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(durations_ms, 99)), 3),
+        'fps': round(1000.0 / mean, 1) if mean > 0 else None
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=module_directory, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_stages(args):
+    """Prepare the fixed inputs and return an ordered list of (name, callable)"""
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"❌ Could not load {args.image}")
+    image = cv2.resize(image, (args.width, args.height))
+
+    jpeg = frametransport.encode_frame(image, binary=True)
+    data_url = frametransport.encode_frame(image, binary=False)
+    b64_data = data_url.split(',', 1)[-1]
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    aspect_ratio = args.width / args.height
+
+    config = pipelineconfig.load_config()
+    if args.model:
+        config = config._replace(model=args.model)
+    pose = pipelineconfig.create_pose(config)
+    tracker = inference.SessionTracker(config._replace(adaptive_input=True))
+    live_array = posefunctions.results_to_array(pose.process(rgb))
+
+    pose_cache = ReferencePoseCache(config=config)
+    reference = pose_cache.get(args.reference)
+    pose_cache.close()
+    if reference is None:
+        raise SystemExit(f"❌ No usable reference pose in {args.reference}")
+    if live_array is None:
+        print("⚠️  Warning: No pose detected in the benchmark image, scoring against the reference")
+        live_array = reference.copy()
+
+    offset_x, offset_y, scale, rotation = posefunctions.fit_similarity_transform(
+        reference, live_array, aspect_ratio=aspect_ratio
+    )
+    adjusted_array = posefunctions.transform_landmarks(
+        reference, offset_x, offset_y, scale, rotation=rotation, aspect_ratio=aspect_ratio
+    )
+    accuracy = posefunctions.calculate_pose_similarity_wo_face(adjusted_array, live_array)
+    # Same renderer across calls, so the reference layer is cached like in a session
+    overlay = OverlayRenderer()
+    display_frame = overlay.draw(image, adjusted_array, live_array, accuracy)
+
+    stages = [
+        ('b64_decode', lambda: base64.b64decode(b64_data)),
+        ('imdecode', lambda: cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)),
+        ('cvtColor', lambda: cv2.cvtColor(image, cv2.COLOR_BGR2RGB)),
+        ('pose_process', lambda: pose.process(rgb)),
+        ('adaptive_inference', lambda: tracker.run(image)),
+        ('fit_alignment', lambda: posefunctions.fit_similarity_transform(
+            reference, live_array, aspect_ratio=aspect_ratio)),
+        ('transform', lambda: posefunctions.transform_landmarks(
+            reference, offset_x, offset_y, scale, rotation=rotation, aspect_ratio=aspect_ratio)),
+        ('similarity', lambda: posefunctions.calculate_pose_similarity_wo_face(adjusted_array, live_array)),
+        ('draw_overlay', lambda: overlay.draw(image, adjusted_array, live_array, accuracy)),
+        ('imencode', lambda: frametransport.encode_frame(display_frame, binary=True)),
+    ]
+
+    if args.db:
+        # Only imported on request so the benchmark runs without a database
+        from exercisestate import create_pool
+
+        pool = create_pool(pool_size=1)
+
+        def db_round_trip():
+            connection = pool.get_connection()
+            try:
+                cursor = connection.cursor()
+                cursor.execute(
+                    "SELECT id, exercise, category, status FROM exercises "
+                    "WHERE status IN (1, 2) ORDER BY status DESC, id ASC"
+                )
+                cursor.fetchall()
+                cursor.close()
+            finally:
+                connection.close()
+
+        stages.append(('db_round_trip', db_round_trip))
+
+    return stages, (pose, tracker)
+
+
+def print_table(results, baseline=None):
+    header = f"{'stage':<20}{'fps':>10}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}"
+    if baseline:
+        header += f"{'p50 change':>12}"
+    print(header)
+    print('-' * len(header))
+
+    for name, stats in results.items():
+        line = f"{name:<20}{stats['fps']:>10}{stats['mean_ms']:>10.3f}{stats['p50_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+        old = (baseline or {}).get(name)
+        if old and old['p50_ms'] > 0:
+            change = (stats['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100.0
+            line += f"{change:>+11.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the pose pipeline")
+    parser.add_argument('--image', default=DEFAULT_IMAGE, help="input image (a person in frame)")
+    parser.add_argument('--reference', default=DEFAULT_REFERENCE, help="reference pose image in std_poses/")
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--stages', help="comma separated subset of stages to run")
+    parser.add_argument('--model', choices=tuple(pipelineconfig.MODEL_COMPLEXITY), help="MediaPipe model")
+    parser.add_argument('--db', action='store_true', help="also time a MySQL round trip")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--compare', help="earlier --json output to compare against")
+    args = parser.parse_args()
+
+    # Single-threaded OpenCV keeps runs comparable across machines and loads
+    cv2.setNumThreads(1)
+
+    stages, (pose, tracker) = build_stages(args)
+    selected = set(args.stages.split(',')) if args.stages else None
+
+    results = {}
+    try:
+        for name, func in stages:
+            if selected is not None and name not in selected:
+                continue
+            results[name] = summarize(time_stage(func, args.iterations, args.warmup))
+    finally:
+        pose.close()
+        tracker.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['stages']
+
+    print_table(results, baseline)
+
+    if args.json:
+        report = {
+            'commit': git_commit(),
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'input': {
+                'image': os.path.basename(args.image),
+                'model': args.model or pipelineconfig.load_config().model,
+                'reference': args.reference,
+                'width': args.width,
+                'height': args.height
+            },
+            'stages': results
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"✓ Results written to {args.json}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
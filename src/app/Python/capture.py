@@ -0,0 +1,129 @@
+"""
+Threaded camera capture and inference for the desktop tools.
+
+CameraCapture reads the camera on its own thread into a latest-frame slot,
+InferenceThread runs the pose model on whatever frame is newest, and the
+main thread only draws and displays results. Capture, inference and display
+overlap, so the tools run at the inference rate instead of the sum of the
+camera interval and inference time. Frames that arrive while inference is
+busy are simply superseded.
+"""
+import threading
+
+import cv2
+
+
+class LatestSlot:
+    """
+    Single-value hand-off between threads where only the newest value matters.
+    Each put() gets a sequence number; get() waits for one newer than the
+    caller last saw.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._value = None
+        self._seq = 0
+        self.closed = False
+
+    def put(self, value):
+        with self._condition:
+            self._value = value
+            self._seq += 1
+            self._condition.notify_all()
+            return self._seq
+
+    def get(self, after=0, timeout=None):
+        """
+        Return (seq, value) for the newest value with seq > after.
+        Returns (after, None) on timeout or once the slot is closed.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > after or self.closed, timeout)
+            if self._seq <= after:
+                return after, None
+            return self._seq, self._value
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class CameraCapture:
+    """Reads frames from a cv2.VideoCapture source on a background thread"""
+
+    def __init__(self, source=0):
+        self.cap = cv2.VideoCapture(source)
+        self.frames = LatestSlot()
+        self.failed = False
+        self._running = False
+        self._thread = None
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="CameraCaptureThread")
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            if not ret:
+                self.failed = True
+                break
+            self.frames.put(frame)
+        self.frames.close()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.cap.release()
+
+
+class InferenceThread:
+    """
+    Runs process(frame) on the newest captured frame, over and over.
+    Results are published as (frame, result) in the results slot.
+    """
+
+    def __init__(self, frames, process):
+        self.frames = frames
+        self.process = process
+        self.results = LatestSlot()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="PoseInferenceThread")
+        self._thread.start()
+        return self
+
+    def _run(self):
+        seq = 0
+        while self._running:
+            seq, frame = self.frames.get(seq, timeout=0.5)
+            if frame is None:
+                if self.frames.closed:
+                    break
+                continue
+            self.results.put((frame, self.process(frame)))
+        self.results.close()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+
+
+def process_pose(pose):
+    """InferenceThread callback running a MediaPipe Pose on a BGR frame"""
+    def process(frame):
+        # Convert the BGR image to RGB for MediaPipe
+        return pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    return process
@@ -0,0 +1,274 @@
+import json
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import mysql.connector.pooling
+
+import metrics
+
+DB_CONFIG = {
+    'host': 'localhost',      # or your server IP
+    'user': 'sql',
+    'password': 'knighthacks',
+    'database': 'yogavision',
+    'port': 3306              # default MariaDB port
+}
+
+# Exercise status lifecycle in the exercises table
+STATUS_IDLE = 0
+STATUS_CALIBRATING = 1
+STATUS_HOLDING = 2
+STATUS_DONE = 3
+
+# Safety-net reload interval in case a change notification is missed
+POLL_INTERVAL = 5.0
+
+Exercise = namedtuple('Exercise', ['id', 'exercise', 'category', 'status'])
+NO_EXERCISE = Exercise(None, None, None, STATUS_IDLE)
+
+
+def ensure_schema(pool):
+    """Add the score_stats column (JSON summary of a hold) if the table predates it"""
+    connection = pool.get_connection()
+    try:
+        cursor = connection.cursor()
+        # ADD COLUMN IF NOT EXISTS is MariaDB-only, so check first (works on MySQL too)
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'exercises' AND COLUMN_NAME = 'score_stats'"
+        )
+        (exists,) = cursor.fetchone()
+        if not exists:
+            cursor.execute("ALTER TABLE exercises ADD COLUMN score_stats TEXT")
+            connection.commit()
+        cursor.close()
+    finally:
+        connection.close()
+
+
+def create_pool(pool_size=4):
+    return mysql.connector.pooling.MySQLConnectionPool(
+        pool_name='yogavision',
+        pool_size=pool_size,
+        **DB_CONFIG
+    )
+
+
+class WriteBehindQueue:
+    """
+    Background writer for status and score updates.
+
+    submit() returns immediately; a single thread drains everything queued
+    so far and commits it as one transaction, so the frame loop never waits
+    on the database.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="DBWriteBehindThread")
+        self._thread.start()
+
+    def submit(self, sql, params, callback=None):
+        """Queue a write; callback (if any) runs on the writer thread after it commits"""
+        with self._pending_lock:
+            self._pending += 1
+        self._queue.put((sql, params, callback))
+
+    def pending(self):
+        with self._pending_lock:
+            return self._pending
+
+    def call_after(self, callback):
+        """Run callback on the writer thread once everything queued so far is committed"""
+        self._queue.put((None, None, callback))
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is committed"""
+        done = threading.Event()
+        self.call_after(done.set)
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Take everything else already waiting into the same transaction
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            writes = [(sql, params) for sql, params, _ in batch if sql is not None]
+            if writes:
+                start = time.perf_counter()
+                try:
+                    self._commit(writes)
+                except Exception as e:
+                    metrics.registry.increment('db_errors')
+                    print(f"❌ Error writing {len(writes)} exercise update(s): {str(e)}")
+                metrics.registry.observe('db_commit', time.perf_counter() - start)
+
+            with self._pending_lock:
+                self._pending -= len(writes)
+
+            for _, _, callback in batch:
+                if callback is not None:
+                    try:
+                        callback()
+                    except Exception as e:
+                        print(f"❌ Error after exercise update: {str(e)}")
+
+    def _commit(self, writes):
+        connection = self.pool.get_connection()
+        try:
+            cursor = connection.cursor()
+            try:
+                for sql, params in writes:
+                    cursor.execute(sql, params)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+        finally:
+            connection.close()
+
+
+class ExerciseStateMachine:
+    """
+    In-memory copy of the active exercise and its status.
+
+    The active exercise is loaded once and then only reloaded when the
+    Next.js updateExercises route reports a change (see notify_changed), or
+    every POLL_INTERVAL seconds as a fallback. Status transitions
+    (1 = calibrating -> 2 = holding -> 3 = done) are applied in memory
+    first and written behind through a WriteBehindQueue.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.writer = WriteBehindQueue(pool)
+        self._lock = threading.Lock()
+        self._current = NO_EXERCISE
+        self._last_load = 0.0
+        # A reload was asked for while writes were pending; it runs once they commit
+        self._reload_deferred = False
+        # Bumped on every change; reload() drops rows read across a transition
+        self.version = 0
+
+    def current(self):
+        """Snapshot of the active exercise"""
+        with self._lock:
+            return self._current
+
+    def reload(self):
+        """Load the active exercise from the database"""
+        # The table lags behind memory until queued writes are committed;
+        # reading it now would undo a transition we just made, so reload
+        # once they are (a change notification must not be lost).
+        # Transitions bump version and queue their write under the lock, so
+        # checking both under it too can't miss one in between
+        with self._lock:
+            if self.writer.pending():
+                self._defer_reload()
+                return self._current
+            version = self.version
+
+        start = time.perf_counter()
+        connection = self.pool.get_connection()
+        try:
+            cursor = connection.cursor(dictionary=True)
+            # An exercise being held takes precedence over one being calibrated
+            cursor.execute(
+                "SELECT id, exercise, category, status FROM exercises "
+                "WHERE status IN (1, 2) ORDER BY status DESC, id ASC"
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            connection.close()
+        metrics.registry.observe('db_reload', time.perf_counter() - start)
+
+        if len([row for row in rows if row['status'] == STATUS_HOLDING]) > 1:
+            print("More than 1 exercise of status 2")
+
+        current = NO_EXERCISE
+        if rows:
+            row = rows[0]
+            current = Exercise(row['id'], row['exercise'], row['category'], row['status'])
+
+        with self._lock:
+            if self.version != version:
+                # A transition happened during the SELECT, so the rows are
+                # stale; read again once its write is committed
+                self._defer_reload()
+                return self._current
+            if current != self._current:
+                print(f"exercise: {current.exercise}, status: {current.status}")
+                self._current = current
+                self.version += 1
+            self._last_load = time.time()
+
+        return current
+
+    def _defer_reload(self):
+        """Reload after the queued writes commit (caller holds _lock)"""
+        if not self._reload_deferred:
+            self._reload_deferred = True
+            self.writer.call_after(self._deferred_reload)
+
+    def _deferred_reload(self):
+        with self._lock:
+            self._reload_deferred = False
+        self.reload()
+
+    def notify_changed(self):
+        """Called when the exercises table was changed outside this process"""
+        return self.reload()
+
+    def poll(self):
+        """Reload if no change has been seen for POLL_INTERVAL seconds"""
+        if time.time() - self._last_load >= POLL_INTERVAL:
+            self.reload()
+
+    def start_holding(self, exercise_id):
+        """Calibration reached: 1 -> 2. Returns False if another session got there first."""
+        with self._lock:
+            if self._current.id != exercise_id or self._current.status != STATUS_CALIBRATING:
+                return False
+            self._current = self._current._replace(status=STATUS_HOLDING)
+            self.version += 1
+            # Queued under the lock so reload() sees it as pending
+            self.writer.submit(
+                "UPDATE exercises SET status = %s WHERE id = %s",
+                (str(STATUS_HOLDING), exercise_id)
+            )
+
+        print("status update: 2")
+        return True
+
+    def finish(self, exercise_id, stats):
+        """
+        Hold completed: 2 -> 3 with the final score, then move to the next exercise.
+        stats is a StreamingScoreStats summary; its mean stays in the score column.
+        """
+        with self._lock:
+            if self._current.id != exercise_id or self._current.status != STATUS_HOLDING:
+                return False
+            self._current = self._current._replace(status=STATUS_DONE)
+            self.version += 1
+            # Pick the next exercise once the table reflects this one as done
+            self.writer.submit(
+                "UPDATE exercises SET status = %s, score = %s, score_stats = %s WHERE id = %s",
+                (str(STATUS_DONE), str(stats.get('mean', 0.0)), json.dumps(stats), exercise_id),
+                callback=self.reload
+            )
+
+        print("status update: 3")
+        return True
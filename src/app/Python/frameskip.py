@@ -0,0 +1,108 @@
+"""
+Load-aware frame skipping.
+
+When a session's frame latency goes over budget, full inference only runs
+on every k-th frame. Frames in between get landmarks extrapolated from the
+last inferred frames, so the overlay and scores keep a steady cadence
+instead of stuttering while the queue drops frames.
+"""
+import threading
+
+import numpy as np
+
+# Arrival -> response latency a session should stay under (seconds)
+LATENCY_BUDGET = 0.12
+# Step k down again once latency falls below this fraction of the budget
+RELAX_FRACTION = 0.6
+# Never skip more than MAX_SKIP - 1 frames in a row
+MAX_SKIP = 4
+# Frames between changes of k, so it doesn't oscillate
+ADJUST_EVERY = 15
+LATENCY_SMOOTHING = 0.2
+# Don't extrapolate further than this past the last inferred frame (seconds)
+MAX_EXTRAPOLATION = 0.25
+
+
+class FrameSkipper:
+    """
+    Decides which frames get full inference and predicts landmarks for the rest.
+
+    Call should_infer() for every frame, record() with the landmarks of each
+    inferred frame, predict() for skipped ones, and observe() with each
+    frame's end-to-end latency (observe() may run on another thread).
+    """
+
+    def __init__(self, budget=LATENCY_BUDGET, max_skip=MAX_SKIP):
+        self.budget = budget
+        self.max_skip = max_skip
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.skip = 1
+            self.latency = None
+            self._frames = 0
+            self._since_adjust = 0
+            # Last two inferred frames as (timestamp, landmarks)
+            self._history = []
+
+    def should_infer(self, timestamp):
+        """True if this frame needs full inference"""
+        with self._lock:
+            self._frames += 1
+            if self.skip <= 1 or not self._history:
+                return True
+            # Don't drift too far from the last real measurement
+            if timestamp - self._history[-1][0] > MAX_EXTRAPOLATION:
+                return True
+            return self._frames % self.skip == 0
+
+    def record(self, landmarks, timestamp):
+        """Remember the landmarks of an inferred frame (None if no pose)"""
+        with self._lock:
+            if landmarks is None:
+                self._history = []
+                return
+            self._history = self._history[-1:] + [(timestamp, landmarks)]
+
+    def predict(self, timestamp):
+        """Linearly extrapolated landmarks for a skipped frame, or None"""
+        with self._lock:
+            history = list(self._history)
+        if not history:
+            return None
+
+        last_time, last = history[-1]
+        if len(history) < 2:
+            return last.copy()
+
+        first_time, first = history[0]
+        span = last_time - first_time
+        if span <= 0:
+            return last.copy()
+
+        ahead = min(timestamp - last_time, MAX_EXTRAPOLATION)
+        predicted = last.copy()
+        predicted[:, 0:3] += (last[:, 0:3] - first[:, 0:3]) * (ahead / span)
+        # Keep the visibility of the last real measurement
+        return predicted.astype(np.float32, copy=False)
+
+    def observe(self, latency):
+        """Feed one frame's arrival -> response latency and adjust k"""
+        with self._lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += LATENCY_SMOOTHING * (latency - self.latency)
+
+            self._since_adjust += 1
+            if self._since_adjust < ADJUST_EVERY:
+                return
+            self._since_adjust = 0
+
+            if self.latency > self.budget and self.skip < self.max_skip:
+                self.skip += 1
+                print(f"⚠️  Latency {self.latency * 1000:.0f} ms over budget, inferring every {self.skip} frames")
+            elif self.latency < self.budget * RELAX_FRACTION and self.skip > 1:
+                self.skip -= 1
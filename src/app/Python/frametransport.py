@@ -0,0 +1,61 @@
+import base64
+
+import cv2
+import numpy as np
+
+JPEG_QUALITY = 70
+
+
+def is_binary(payload):
+    return isinstance(payload, (bytes, bytearray, memoryview))
+
+
+def decode_frame(payload):
+    """
+    Decode a frame sent by the frontend into a BGR image.
+
+    Accepts raw JPEG/WebP bytes (Socket.IO binary attachment) or, as a
+    fallback, a base64 data URL string. Returns None if decoding fails.
+    """
+    if is_binary(payload):
+        img_bytes = payload
+    elif isinstance(payload, str):
+        # Remove data:image/jpeg;base64,
+        image_data = payload.split(',', 1)[-1]
+        img_bytes = base64.b64decode(image_data)
+    else:
+        return None
+
+    nparr = np.frombuffer(img_bytes, np.uint8)
+    if nparr.size == 0:
+        return None
+
+    return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+
+def encode_frame(image, binary=True, quality=JPEG_QUALITY):
+    """
+    Encode a processed frame for the frontend.
+
+    Returns raw JPEG bytes when binary is True, otherwise a base64 data URL.
+    """
+    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), quality]
+    _, buffer = cv2.imencode('.jpg', img=image, params=encode_param)
+
+    if binary:
+        return buffer.tobytes()
+
+    processed_base64 = base64.b64encode(buffer).decode('utf-8')
+    return f'data:image/jpeg;base64,{processed_base64}'
+
+
+def pack_landmarks(landmarks):
+    """
+    Pack a (33, 4) landmark array as raw little-endian float32 bytes
+    (528 bytes) for the landmarks-only response mode. The client reads it
+    back with a Float32Array, 4 values (x, y, z, visibility) per landmark.
+    """
+    if landmarks is None:
+        return None
+
+    return np.ascontiguousarray(landmarks, dtype='<f4').tobytes()
@@ -0,0 +1,410 @@
+import base64
+import time
+import threading
+import multiprocessing
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+import posefunctions
+import frametransport
+import pipelineconfig
+from poseroi import AdaptiveInput
+
+# Largest compressed frame and decoded image a process worker accepts
+MAX_FRAME_BYTES = 4 * 1024 * 1024
+MAX_IMAGE_BYTES = 1920 * 1080 * 3
+LANDMARK_BYTES = posefunctions.NUM_LANDMARKS * 4 * 4
+
+# image is None when the caller didn't ask for the decoded frame;
+# landmarks is None when no pose was detected; timing holds the decode and
+# inference durations in seconds. error is set (and the rest None) when the
+# frame produced nothing: 'decode' (not an image), 'too_large' (over the
+# process worker's limits) or 'error' (inference failed)
+InferenceResult = namedtuple('InferenceResult', ['image', 'shape', 'landmarks', 'timing', 'error'],
+                             defaults=(None, None))
+
+
+def failed(error):
+    """InferenceResult for a frame that produced nothing"""
+    return InferenceResult(None, None, None, error=error)
+
+
+def run_inference(pose, img, adaptive=None):
+    """
+    Run MediaPipe on a BGR image and return the (33, 4) landmark array or None.
+    With an AdaptiveInput, inference runs on a downsampled crop around the
+    tracked body and the landmarks are mapped back to the full frame.
+    """
+    window = None
+    if adaptive is not None:
+        img_input, window = adaptive.prepare(img)
+    else:
+        img_input = img
+
+    # Convert to RGB for MediaPipe
+    rgb_frame = cv2.cvtColor(img_input, cv2.COLOR_BGR2RGB)
+    live_results = pose.process(rgb_frame)
+    live_array = posefunctions.results_to_array(live_results)
+
+    if adaptive is not None:
+        live_array = adaptive.restore(live_array, window, img.shape)
+        adaptive.update(live_array, img.shape)
+    return live_array
+
+
+class SessionTracker:
+    """One session's MediaPipe tracker and, optionally, its adaptive input stage"""
+
+    def __init__(self, config=pipelineconfig.DEFAULT_CONFIG):
+        self.config = config
+        self.pose = pipelineconfig.create_pose(config)
+        self.adaptive = AdaptiveInput(config.inference_size) if config.adaptive_input else None
+
+    def run(self, img):
+        return run_inference(self.pose, img, self.adaptive)
+
+    def close(self):
+        self.pose.close()
+
+
+def to_frame_bytes(payload):
+    """Normalize a frame payload (binary or base64 data URL) to compressed bytes"""
+    if frametransport.is_binary(payload):
+        return bytes(payload)
+    if isinstance(payload, str):
+        return base64.b64decode(payload.split(',', 1)[-1])
+    return None
+
+
+class ThreadBackend:
+    """
+    Decode and inference in the calling thread.
+    Each session gets its own SessionTracker.
+    """
+
+    def __init__(self, config=pipelineconfig.DEFAULT_CONFIG):
+        self.config = config
+        self._trackers = {}
+        self._configs = {}
+        self._lock = threading.Lock()
+
+    def _tracker_for(self, key):
+        with self._lock:
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = self._trackers[key] = SessionTracker(self._configs.get(key, self.config))
+            return tracker
+
+    def configure(self, key, config):
+        """Use a different PipelineConfig for one session; its tracker is rebuilt"""
+        with self._lock:
+            self._configs[key] = config
+            tracker = self._trackers.pop(key, None)
+        if tracker is not None:
+            tracker.close()
+
+    def prepare(self, payload):
+        """Decode stage ahead of infer(): returns the BGR image, or None"""
+        return frametransport.decode_frame(payload)
+
+    def infer(self, key, payload, want_image=True, run_pose=True):
+        """
+        Decode a frame (unless payload is an image from prepare()) and run
+        pose inference for one session.
+        Returns an InferenceResult ('decode' error if decoding failed).
+        With run_pose False the frame is only decoded (landmarks is None).
+        """
+        timing = {}
+        if isinstance(payload, np.ndarray):
+            img = payload
+        else:
+            start = time.perf_counter()
+            img = frametransport.decode_frame(payload)
+            if img is None:
+                return failed('decode')
+            timing['decode'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        live_array = self._tracker_for(key).run(img) if run_pose else None
+        timing['inference'] = time.perf_counter() - start
+        return InferenceResult(img, img.shape, live_array, timing)
+
+    def release(self, key):
+        with self._lock:
+            tracker = self._trackers.pop(key, None)
+            self._configs.pop(key, None)
+        if tracker is not None:
+            tracker.close()
+
+    def close(self):
+        with self._lock:
+            for tracker in self._trackers.values():
+                tracker.close()
+            self._trackers.clear()
+            self._configs.clear()
+
+
+def _process_worker(conn, in_name, out_name, config):
+    """
+    Worker process: owns one SessionTracker per session routed to it.
+    Compressed frames arrive in the input shared memory block; landmarks
+    and (optionally) the decoded image are written to the output block.
+    """
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    shm_out = shared_memory.SharedMemory(name=out_name)
+    out_landmarks = np.ndarray((posefunctions.NUM_LANDMARKS, 4), dtype=np.float32, buffer=shm_out.buf)
+    trackers = {}
+    configs = {}
+
+    try:
+        while True:
+            message = conn.recv()
+            command = message[0]
+
+            if command == 'stop':
+                break
+
+            if command == 'release':
+                tracker = trackers.pop(message[1], None)
+                configs.pop(message[1], None)
+                if tracker is not None:
+                    tracker.close()
+                continue
+
+            if command == 'configure':
+                _, key, session_config = message
+                configs[key] = session_config
+                tracker = trackers.pop(key, None)
+                if tracker is not None:
+                    tracker.close()
+                continue
+
+            # ('infer', key, nbytes, want_image, run_pose)
+            _, key, nbytes, want_image, run_pose = message
+            start = time.perf_counter()
+            nparr = np.frombuffer(shm_in.buf, dtype=np.uint8, count=nbytes)
+            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # Views into shared memory must not outlive the iteration
+            del nparr
+            if img is None:
+                conn.send(('decode', None, False, None))
+                continue
+            # Only the copy back is limited by the output block; landmarks-only
+            # requests work at any resolution
+            if want_image and img.nbytes > MAX_IMAGE_BYTES:
+                print(f"⚠️ Frame of {img.shape[1]}x{img.shape[0]} too large to return from the "
+                      f"worker process (limit {MAX_IMAGE_BYTES} bytes)")
+                conn.send(('too_large', None, False, None))
+                continue
+            decoded = time.perf_counter()
+
+            tracker = trackers.get(key)
+            if tracker is None:
+                tracker = trackers[key] = SessionTracker(configs.get(key, config))
+
+            try:
+                live_array = tracker.run(img) if run_pose else None
+            except Exception as e:
+                # Always answer, the server thread is blocked on this reply
+                print(f"❌ Inference error in worker process: {str(e)}")
+                conn.send(('error', None, False, None))
+                continue
+            timing = {'decode': decoded - start, 'inference': time.perf_counter() - decoded}
+            if live_array is not None:
+                out_landmarks[:] = live_array
+
+            if want_image:
+                out_image = np.ndarray(img.shape, dtype=np.uint8, buffer=shm_out.buf, offset=LANDMARK_BYTES)
+                out_image[:] = img
+                del out_image
+
+            conn.send((None, img.shape, live_array is not None, timing))
+    finally:
+        for tracker in trackers.values():
+            tracker.close()
+        del out_landmarks
+        shm_in.close()
+        shm_out.close()
+
+
+class _ProcessSlot:
+    """One worker process with its shared memory blocks and request lock"""
+
+    def __init__(self, context, index, config=pipelineconfig.DEFAULT_CONFIG):
+        self.context = context
+        self.index = index
+        self.config = config
+        self.lock = threading.Lock()
+        self.shm_in = shared_memory.SharedMemory(create=True, size=MAX_FRAME_BYTES)
+        self.shm_out = shared_memory.SharedMemory(create=True, size=LANDMARK_BYTES + MAX_IMAGE_BYTES)
+        self._start()
+
+    def _start(self):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=_process_worker,
+            args=(child_conn, self.shm_in.name, self.shm_out.name, self.config),
+            daemon=True,
+            name=f"PoseInferenceProcess-{self.index}"
+        )
+        self.process.start()
+        # The child's end lives on in the worker
+        child_conn.close()
+
+    def restart(self):
+        """Replace the worker process with a fresh one (caller holds lock)"""
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=2.0)
+        self._start()
+
+    def close(self):
+        with self.lock:
+            try:
+                self.conn.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.conn.close()
+            self.shm_in.close()
+            self.shm_in.unlink()
+            self.shm_out.close()
+            self.shm_out.unlink()
+
+
+class ProcessBackend:
+    """
+    Decode and inference in a pool of worker processes, so MediaPipe and
+    OpenCV don't contend with Socket.IO for the GIL.
+
+    Each session is pinned to one worker process (its tracker lives there).
+    Frames and results are passed through shared memory; the pipe only
+    carries small control messages. A worker that dies is restarted on the
+    next request and its sessions' configs are sent to the new one (their
+    trackers start over).
+    """
+
+    def __init__(self, num_processes, config=pipelineconfig.DEFAULT_CONFIG):
+        self.config = config
+        context = multiprocessing.get_context('spawn')
+        self._slots = [_ProcessSlot(context, i, config) for i in range(max(1, num_processes))]
+        self._assignments = {}
+        # Per-session config overrides, re-sent when a worker is restarted
+        self._configs = {}
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+    def _slot_for(self, key):
+        with self._lock:
+            index = self._assignments.get(key)
+            if index is None:
+                # Round-robin new sessions over the workers
+                index = self._assignments[key] = self._next_slot
+                self._next_slot = (self._next_slot + 1) % len(self._slots)
+            return self._slots[index]
+
+    def _restart(self, slot):
+        """Restart a dead worker and re-register its sessions (caller holds slot.lock)"""
+        print(f"⚠️ Inference process {slot.index} died, restarting it")
+        slot.restart()
+        with self._lock:
+            configs = [(key, self._configs[key]) for key, index in self._assignments.items()
+                       if index == slot.index and key in self._configs]
+        for key, config in configs:
+            slot.conn.send(('configure', key, config))
+
+    def _send(self, slot, message):
+        """Send a control message to a worker (caller holds slot.lock)"""
+        if not slot.process.is_alive():
+            self._restart(slot)
+        try:
+            slot.conn.send(message)
+        except OSError:
+            self._restart(slot)
+            slot.conn.send(message)
+
+    def infer(self, key, payload, want_image=True, run_pose=True):
+        """
+        Decode a frame and run pose inference for one session.
+        Returns an InferenceResult, with error set if the frame produced
+        nothing. The decoded image is only copied back when want_image is set,
+        and inference is skipped when run_pose is False.
+        """
+        frame_bytes = to_frame_bytes(payload)
+        if not frame_bytes:
+            return failed('decode')
+        if len(frame_bytes) > MAX_FRAME_BYTES:
+            return failed('too_large')
+
+        slot = self._slot_for(key)
+        with slot.lock:
+            slot.shm_in.buf[:len(frame_bytes)] = frame_bytes
+            try:
+                self._send(slot, ('infer', key, len(frame_bytes), want_image, run_pose))
+                error, shape, has_pose, timing = slot.conn.recv()
+            except (EOFError, OSError):
+                # Died while working on this frame; the next one gets a new worker
+                self._restart(slot)
+                return failed('error')
+            if error is not None:
+                return failed(error)
+
+            live_array = None
+            if has_pose:
+                live_array = np.ndarray((posefunctions.NUM_LANDMARKS, 4), dtype=np.float32,
+                                        buffer=slot.shm_out.buf).copy()
+
+            img = None
+            if want_image:
+                img = np.ndarray(shape, dtype=np.uint8, buffer=slot.shm_out.buf,
+                                 offset=LANDMARK_BYTES).copy()
+
+        return InferenceResult(img, shape, live_array, timing)
+
+    def prepare(self, payload):
+        """
+        Decode stage ahead of infer(). Images are decoded in the worker
+        process, so this only unwraps base64 payloads to compressed bytes.
+        """
+        frame_bytes = to_frame_bytes(payload)
+        if not frame_bytes or len(frame_bytes) > MAX_FRAME_BYTES:
+            return None
+        return frame_bytes
+
+    def configure(self, key, config):
+        """Use a different PipelineConfig for one session; its tracker is rebuilt"""
+        with self._lock:
+            self._configs[key] = config
+        slot = self._slot_for(key)
+        with slot.lock:
+            self._send(slot, ('configure', key, config))
+
+    def release(self, key):
+        with self._lock:
+            index = self._assignments.pop(key, None)
+            self._configs.pop(key, None)
+        if index is None:
+            return
+
+        slot = self._slots[index]
+        with slot.lock:
+            self._send(slot, ('release', key))
+
+    def close(self):
+        for slot in self._slots:
+            slot.close()
+
+
+def create_backend(name, num_processes=None, config=pipelineconfig.DEFAULT_CONFIG):
+    """Create the inference backend named in the server config ('thread' or 'process')"""
+    if name == 'process':
+        return ProcessBackend(num_processes or multiprocessing.cpu_count(), config)
+    if name == 'thread':
+        return ThreadBackend(config)
+    raise ValueError(f"Unknown inference backend: {name}")
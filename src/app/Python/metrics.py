@@ -0,0 +1,160 @@
+"""
+Lightweight in-process metrics for the pose server.
+
+Per-stage latencies go into fixed-size log-bucket histograms (constant
+memory, approximate percentiles) and events into counters. The server
+exposes a snapshot on /metrics; a FrameTimer collects one frame's spans so
+they can also be sent back in processed_frame.
+"""
+import threading
+import time
+
+import numpy as np
+
+# Latency histogram buckets: 0.05 ms up to ~30 s, 15% apart
+BUCKET_START_MS = 0.05
+BUCKET_GROWTH = 1.15
+NUM_BUCKETS = 96
+BUCKET_EDGES_MS = BUCKET_START_MS * BUCKET_GROWTH ** np.arange(NUM_BUCKETS)
+
+# Stages in pipeline order, so reports always list them the same way.
+# 'transfer' is backend overhead around decode + inference (process IPC),
+# 'total' runs from frame arrival until the response is handed to emit.
+STAGES = (
+    'queue_wait', 'decode', 'inference', 'transfer', 'scoring', 'draw', 'encode',
+    'total', 'emit', 'db_commit', 'db_reload'
+)
+
+
+class LatencyHistogram:
+    """Count, sum, max and approximate percentiles of a latency in ms"""
+
+    def __init__(self):
+        self.buckets = np.zeros(NUM_BUCKETS + 1, dtype=np.int64)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, value_ms):
+        self.buckets[np.searchsorted(BUCKET_EDGES_MS, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def percentile(self, q):
+        if self.count == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.buckets), q / 100.0 * self.count))
+        # Report the upper edge of the bucket the percentile falls in
+        if index >= NUM_BUCKETS:
+            return self.max_ms
+        return min(float(BUCKET_EDGES_MS[index]), self.max_ms)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(50), 3),
+            'p99_ms': round(self.percentile(99), 3),
+            'max_ms': round(self.max_ms, 3)
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe counters and latency histograms shared by all sessions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.latencies = {}
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, stage, seconds):
+        """Record one latency sample for a stage"""
+        with self._lock:
+            histogram = self.latencies.get(stage)
+            if histogram is None:
+                histogram = self.latencies[stage] = LatencyHistogram()
+            histogram.add(seconds * 1000.0)
+
+    def observe_timer(self, timer):
+        for stage, seconds in timer.spans.items():
+            self.observe(stage, seconds)
+
+    def snapshot(self):
+        """Dict of all counters and stage summaries, suitable for JSON"""
+        with self._lock:
+            order = [stage for stage in STAGES if stage in self.latencies]
+            order += sorted(stage for stage in self.latencies if stage not in STAGES)
+            return {
+                'uptime': round(time.time() - self.started, 1),
+                'counters': dict(sorted(self.counters.items())),
+                'latency': {stage: self.latencies[stage].summary() for stage in order}
+            }
+
+    def render_prometheus(self):
+        """Snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in snapshot['counters'].items():
+            lines.append(f'# TYPE pose_{name}_total counter')
+            lines.append(f'pose_{name}_total {value}')
+
+        lines.append('# TYPE pose_stage_latency_ms summary')
+        for stage, summary in snapshot['latency'].items():
+            lines.append(f'pose_stage_latency_ms{{stage="{stage}",quantile="0.5"}} {summary["p50_ms"]}')
+            lines.append(f'pose_stage_latency_ms{{stage="{stage}",quantile="0.99"}} {summary["p99_ms"]}')
+            lines.append(f'pose_stage_latency_ms_sum{{stage="{stage}"}} {summary["sum_ms"]}')
+            lines.append(f'pose_stage_latency_ms_count{{stage="{stage}"}} {summary["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+class FrameTimer:
+    """
+    Spans of a single frame, in seconds.
+
+    with timer.span('encode'):
+        ...
+    """
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.spans = {}
+
+    def add(self, stage, seconds):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def span(self, stage):
+        return _Span(self, stage)
+
+    def finish(self):
+        self.spans['total'] = time.perf_counter() - self.start
+
+    def as_millis(self):
+        return {stage: round(seconds * 1000.0, 3) for stage, seconds in self.spans.items()}
+
+
+class _Span:
+    def __init__(self, timer, stage):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.add(self.stage, time.perf_counter() - self.start)
+
+
+# Process-wide registry used by the server, sessions and the DB writer
+registry = MetricsRegistry()
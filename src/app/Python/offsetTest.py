@@ -5,6 +5,8 @@ import math
 import os
 
 import posefunctions
+from capture import CameraCapture, InferenceThread, process_pose
+import pipelineconfig
 
 module_path = os.path.abspath(__file__)
 module_directory = os.path.dirname(module_path)
@@ -13,10 +15,8 @@ print(module_directory)
 # Initialize MediaPipe Pose
 mp_pose = mp.solutions.pose
 mp_drawing = mp.solutions.drawing_utils
-pose = mp_pose.Pose(
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
+# Model and thresholds come from the shared pipeline config ($POSE_PIPELINE_CONFIG)
+pose = pipelineconfig.create_pose(pipelineconfig.load_config())
 
 # Load the saved pose image
 saved_image = cv2.imread(f'{module_directory}/std_poses/savedPose.jpg')
@@ -43,13 +43,18 @@ if saved_results.pose_landmarks:
 else:
     print("Warning: No pose detected in saved image")
 
-# Initialize the camera
-cap = cv2.VideoCapture(0)
+saved_array = posefunctions.results_to_array(saved_results)
 
-if not cap.isOpened():
+# Initialize the camera; capture and inference run on their own threads
+capture = CameraCapture(0)
+
+if not capture.isOpened():
     print("Error: Could not open camera")
     exit()
 
+capture.start()
+inference = InferenceThread(capture.frames, process_pose(pose)).start()
+
 print("Camera feed started!")
 print("Green overlay = Live pose")
 print("Blue overlay = Saved pose reference")
@@ -67,45 +72,31 @@ scale = 1.0
 move_step = 0.01  # Movement step (as fraction of image size)
 scale_step = 0.05  # Scale step
 
+result_seq = 0
 while True:
-    # Capture frame-by-frame
-    ret, frame = cap.read()
+    # Wait for the newest processed frame
+    result_seq, result = inference.results.get(result_seq, timeout=1.0)
     
-    if not ret:
-        print("Error: Can't receive frame. Exiting...")
-        break
+    if result is None:
+        if inference.results.closed:
+            print("Error: Can't receive frame. Exiting...")
+            break
+        continue
     
-    # Convert the BGR image to RGB for MediaPipe
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    
-    # Process the live frame with MediaPipe Pose
-    live_results = pose.process(rgb_frame)
+    frame, live_results = result
     
     # Create display frame
     display_frame = frame.copy()
     
+    # Apply scale from center (0.5, 0.5) and offset
+    adjusted_array = posefunctions.transform_landmarks(saved_array, offset_x, offset_y, scale)
+    live_array = posefunctions.results_to_array(live_results)
+
     # Draw SAVED pose landmarks on the live frame (in RED) with offset and scale
-    if saved_results.pose_landmarks:
-        # Create a copy of landmarks with offset and scale applied
-        adjusted_landmarks = mp_pose.PoseLandmark
-        landmark_list = []
-        
-        for landmark in saved_results.pose_landmarks.landmark:
-            adjusted_landmark = type(landmark)()
-            # Apply scale from center (0.5, 0.5)
-            adjusted_landmark.x = (landmark.x - 0.5) * scale + 0.5 + offset_x
-            adjusted_landmark.y = (landmark.y - 0.5) * scale + 0.5 + offset_y
-            adjusted_landmark.z = landmark.z * scale
-            adjusted_landmark.visibility = landmark.visibility
-            landmark_list.append(adjusted_landmark)
-        
-        # Create new landmark list
-        adjusted_pose = type(saved_results.pose_landmarks)()
-        adjusted_pose.landmark.extend(landmark_list)
-        
+    if adjusted_array is not None:
         mp_drawing.draw_landmarks(
             display_frame,
-            adjusted_pose,
+            posefunctions.array_to_landmarks(adjusted_array),
             mp_pose.POSE_CONNECTIONS,
             mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2),
             mp_drawing.DrawingSpec(color=(0, 0, 255), thickness=2, circle_radius=2)
@@ -122,23 +113,10 @@ while True:
         )
     
     # Calculate and display accuracy score
-    if saved_results.pose_landmarks and live_results.pose_landmarks:
-        # Create adjusted landmarks for comparison
-        landmark_list = []
-        for landmark in saved_results.pose_landmarks.landmark:
-            adjusted_landmark = type(landmark)()
-            adjusted_landmark.x = (landmark.x - 0.5) * scale + 0.5 + offset_x
-            adjusted_landmark.y = (landmark.y - 0.5) * scale + 0.5 + offset_y
-            adjusted_landmark.z = landmark.z * scale
-            adjusted_landmark.visibility = landmark.visibility
-            landmark_list.append(adjusted_landmark)
-        
-        adjusted_pose = type(saved_results.pose_landmarks)()
-        adjusted_pose.landmark.extend(landmark_list)
-        
+    if adjusted_array is not None and live_array is not None:
         # Calculate similarity
-        # accuracy = calculate_pose_similarity(adjusted_pose, live_results.pose_landmarks)
-        offset_x1, offset_y1, scale1 = posefunctions.calculate_alignment(adjusted_pose, live_results.pose_landmarks)
+        # accuracy = calculate_pose_similarity(adjusted_array, live_array)
+        offset_x1, offset_y1, scale1 = posefunctions.calculate_alignment(adjusted_array, live_array)
         
         # # Display accuracy score with color coding
         # if accuracy >= 80:
@@ -189,7 +167,8 @@ while True:
         break
 
 # Release resources
-cap.release()
+inference.stop()
+capture.stop()
 cv2.destroyAllWindows()
 pose.close()
 print("Pose comparison closed")
\ No newline at end of file
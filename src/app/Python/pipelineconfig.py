@@ -0,0 +1,125 @@
+"""
+Shared MediaPipe pipeline configuration.
+
+One PipelineConfig describes how Pose trackers are built and how frames
+are prepared for them. The server picks one per deployment (optionally from
+a JSON file named by POSE_PIPELINE_CONFIG, or by auto_select() for a target
+fps) and sessions can override it; the desktop scripts and the reference
+pose cache build their trackers from it too.
+"""
+import json
+import os
+import time
+from collections import namedtuple
+
+import cv2
+import mediapipe as mp
+
+from poseroi import INFERENCE_SIZE
+
+# MediaPipe model_complexity values
+MODEL_COMPLEXITY = {'lite': 0, 'full': 1, 'heavy': 2}
+
+# Heaviest first, for auto_select
+MODELS_BY_COST = ('heavy', 'full', 'lite')
+
+module_path = os.path.abspath(__file__)
+module_directory = os.path.dirname(module_path)
+
+AUTO_SELECT_IMAGE = os.path.join(module_directory, 'std_poses', 't_pose.jpg')
+
+PipelineConfig = namedtuple('PipelineConfig', [
+    'model',                     # 'lite', 'full' or 'heavy'
+    'smooth_landmarks',
+    'enable_segmentation',
+    'min_detection_confidence',
+    'min_tracking_confidence',
+    'inference_size',            # long side of the inference input in px (None = full frame)
+    'adaptive_input'             # crop around the tracked body (see poseroi.py)
+], defaults=('full', True, False, 0.5, 0.5, INFERENCE_SIZE, True))
+
+DEFAULT_CONFIG = PipelineConfig()
+
+
+def validate(config):
+    """Raise ValueError if a config has out-of-range values; returns it otherwise"""
+    if config.model not in MODEL_COMPLEXITY:
+        raise ValueError(f"Unknown model '{config.model}', expected one of {', '.join(MODEL_COMPLEXITY)}")
+    for name in ('min_detection_confidence', 'min_tracking_confidence'):
+        value = getattr(config, name)
+        if not 0.0 <= value <= 1.0:
+            raise ValueError(f"{name} must be between 0 and 1, got {value}")
+    if config.inference_size is not None and config.inference_size < 64:
+        raise ValueError(f"inference_size must be at least 64, got {config.inference_size}")
+    return config
+
+
+def config_from_dict(data, base=DEFAULT_CONFIG):
+    """Apply the known keys of a dict (e.g. a Socket.IO payload) on top of base"""
+    updates = {key: data[key] for key in PipelineConfig._fields if key in data}
+    return validate(base._replace(**updates))
+
+
+def load_config(path=None, base=DEFAULT_CONFIG):
+    """
+    Deployment config from a JSON file (default: $POSE_PIPELINE_CONFIG).
+    Returns base unchanged if no file is configured.
+    """
+    path = path or os.environ.get('POSE_PIPELINE_CONFIG')
+    if not path:
+        return base
+
+    with open(path) as f:
+        return config_from_dict(json.load(f), base)
+
+
+def create_pose(config=DEFAULT_CONFIG, static_image_mode=False):
+    """Build a MediaPipe Pose tracker from a config"""
+    return mp.solutions.pose.Pose(
+        static_image_mode=static_image_mode,
+        model_complexity=MODEL_COMPLEXITY[config.model],
+        smooth_landmarks=config.smooth_landmarks,
+        enable_segmentation=config.enable_segmentation,
+        min_detection_confidence=config.min_detection_confidence,
+        min_tracking_confidence=config.min_tracking_confidence
+    )
+
+
+def measure_fps(config, image, frames=30, warmup=5):
+    """Frames/sec of pose.process for a config on one BGR image"""
+    height, width = image.shape[:2]
+    if config.inference_size and max(width, height) > config.inference_size:
+        factor = config.inference_size / max(width, height)
+        image = cv2.resize(image, (round(width * factor), round(height * factor)), interpolation=cv2.INTER_AREA)
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    pose = create_pose(config)
+    try:
+        for _ in range(warmup):
+            pose.process(rgb)
+        start = time.perf_counter()
+        for _ in range(frames):
+            pose.process(rgb)
+        return frames / (time.perf_counter() - start)
+    finally:
+        pose.close()
+
+
+def auto_select(target_fps, base=DEFAULT_CONFIG, image_path=AUTO_SELECT_IMAGE, frames=30):
+    """
+    Pick the heaviest model that still runs at target_fps on this CPU.
+    Falls back to 'lite' if none does.
+    """
+    image = cv2.imread(image_path)
+    if image is None:
+        print(f"⚠️  Warning: Could not load {image_path}, keeping model '{base.model}'")
+        return base
+
+    for model in MODELS_BY_COST:
+        config = base._replace(model=model)
+        fps = measure_fps(config, image, frames)
+        print(f"  model {model}: {fps:.1f} fps")
+        if fps >= target_fps:
+            return config
+
+    return base._replace(model='lite')
@@ -0,0 +1,175 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+import posefunctions
+import pipelineconfig
+import trajectory
+
+module_path = os.path.abspath(__file__)
+module_directory = os.path.dirname(module_path)
+
+POSE_DIR = os.path.join(module_directory, 'std_poses')
+CACHE_DIR = os.path.join(module_directory, 'pose_cache')
+CATALOG_PATH = os.path.join(module_directory, '..', '..', '..', 'public', 'data', 'sorted_exercises.json')
+
+
+def catalog_exercises(catalog_path=CATALOG_PATH):
+    """Return every exercise name in sorted_exercises.json, in catalog order"""
+    with open(catalog_path) as f:
+        catalog = json.load(f)
+
+    return [item['exercise'] for category in catalog.values() for item in category]
+
+
+def pose_file_for(exercise):
+    return f'{exercise}_pose.jpg'
+
+
+class ReferencePoseCache:
+    """
+    Caches reference pose landmarks extracted from the images in std_poses/.
+
+    Each entry is keyed by file path + mtime, so editing a pose image
+    invalidates it. Landmarks are kept in memory as (33, 4) float32 arrays
+    with LRU eviction and persisted to pose_cache/ as single-frame float32
+    .traj files (see trajectory.py) so a server restart doesn't need to run
+    MediaPipe again. Entries are per model, since landmarks differ between
+    model complexities: get() takes the model of the session asking
+    (default: the cache's own config).
+    """
+
+    def __init__(self, pose_dir=POSE_DIR, cache_dir=CACHE_DIR, max_entries=16,
+                 config=pipelineconfig.DEFAULT_CONFIG):
+        self.pose_dir = pose_dir
+        self.config = config
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Static-image Pose per model, created on first use
+        self._poses = {}
+
+    def get(self, file_name, model=None):
+        """
+        Return the (33, 4) landmark array for a pose image, as extracted by
+        model, or None if the file is missing or no pose could be detected in it.
+        """
+        model = model or self.config.model
+        pose_path = os.path.join(self.pose_dir, file_name)
+        try:
+            mtime = os.stat(pose_path).st_mtime_ns
+        except FileNotFoundError:
+            print(f"⚠️  Warning: Saved pose file not found at {pose_path}")
+            return None
+
+        key = (pose_path, mtime, model)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+            landmarks = self._load_from_disk(file_name, mtime, model)
+            if landmarks is None:
+                landmarks = self._extract(pose_path, model)
+                if landmarks is not None:
+                    self._save_to_disk(file_name, mtime, model, landmarks)
+
+            # Cache misses too, so a pose image without a detectable person
+            # isn't re-processed on every frame
+            self._entries[key] = landmarks
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+            return landmarks
+
+    def get_stack(self, exercises, model=None):
+        """
+        Load reference landmarks for several exercises at once.
+
+        Returns:
+            tuple: (names, stack)
+            - names: exercises that have a usable reference pose
+            - stack: (N, 33, 4) float32 array in the same order as names
+        """
+        names = []
+        arrays = []
+        for exercise in exercises:
+            landmarks = self.get(pose_file_for(exercise), model)
+            if landmarks is not None:
+                names.append(exercise)
+                arrays.append(landmarks)
+
+        if not arrays:
+            return names, np.zeros((0, posefunctions.NUM_LANDMARKS, 4), dtype=np.float32)
+
+        return names, np.stack(arrays)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        with self._lock:
+            for pose in self._poses.values():
+                pose.close()
+            self._poses.clear()
+
+    def _cache_path(self, file_name, model):
+        return os.path.join(self.cache_dir, f"{os.path.splitext(file_name)[0]}.{model}.traj")
+
+    def _load_from_disk(self, file_name, mtime, model):
+        cache_path = self._cache_path(file_name, model)
+        if not os.path.exists(cache_path):
+            return None
+
+        try:
+            cached = trajectory.open_trajectory(cache_path)
+            if (cached.metadata.get('mtime') != mtime or cached.metadata.get('model') != model
+                    or len(cached.landmarks) != 1):
+                return None
+            return trajectory.frame_array(cached, 0)
+        except Exception as e:
+            print(f"⚠️  Warning: Ignoring unreadable pose cache {cache_path}: {str(e)}")
+            return None
+
+    def _save_to_disk(self, file_name, mtime, model, landmarks):
+        cache_path = self._cache_path(file_name, model)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = cache_path + '.tmp'
+            trajectory.write_trajectory(
+                tmp_path, landmarks[np.newaxis], fps=0,
+                source=os.path.join(self.pose_dir, file_name),
+                dtype=np.float32, mtime=mtime, model=model
+            )
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"⚠️  Warning: Could not write pose cache {cache_path}: {str(e)}")
+
+    def _extract(self, pose_path, model):
+        saved_image = cv2.imread(pose_path)
+        if saved_image is None:
+            print(f"⚠️  Warning: Could not load saved pose from {pose_path}")
+            return None
+
+        # Reference images are single stills, so use a static-image model
+        # rather than sharing the live tracker and disturbing its state
+        pose = self._poses.get(model)
+        if pose is None:
+            pose = self._poses[model] = pipelineconfig.create_pose(
+                self.config._replace(model=model), static_image_mode=True
+            )
+
+        saved_rgb = cv2.cvtColor(saved_image, cv2.COLOR_BGR2RGB)
+        saved_results = pose.process(saved_rgb)
+        if not saved_results.pose_landmarks:
+            print(f"⚠️  Warning: No pose detected in saved image {pose_path}")
+            return None
+
+        return posefunctions.landmarks_to_array(saved_results.pose_landmarks)
@@ -0,0 +1,134 @@
+import math
+import time
+
+import numpy as np
+
+# Hold detection thresholds (scores are 0-100)
+HOLD_ENTER_SCORE = 80.0
+HOLD_EXIT_SCORE = 70.0
+# How long the score may sit below HOLD_EXIT_SCORE before the hold is lost
+HOLD_GRACE_SECONDS = 0.5
+HOLD_SECONDS = 10.0
+
+
+def _smoothing_factor(cutoff, dt):
+    tau = 1.0 / (2.0 * math.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class LandmarkFilter:
+    """
+    One-Euro filter over whole (33, 4) landmark arrays.
+
+    Slow movement is smoothed heavily (removes detection jitter) while fast
+    movement passes through with little lag. Each landmark's update is scaled
+    by its visibility, so occluded joints lean on their history instead of
+    jumping around. Cost per frame is a few array ops regardless of history.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.5, d_cutoff=1.0, min_visibility=0.1, reset_after=0.5):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.min_visibility = min_visibility
+        # Start over if no pose was seen for this long
+        self.reset_after = reset_after
+        self.reset()
+
+    def reset(self):
+        self._value = None
+        self._derivative = None
+        self._last_time = None
+
+    def __call__(self, landmarks, timestamp=None):
+        """Filter one frame; returns a new array (or None if landmarks is None)"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        if landmarks is None:
+            if self._last_time is not None and timestamp - self._last_time > self.reset_after:
+                self.reset()
+            return None
+
+        if self._value is None:
+            self._value = landmarks.copy()
+            self._derivative = np.zeros_like(landmarks[:, 0:3])
+            self._last_time = timestamp
+            return self._value.copy()
+
+        dt = timestamp - self._last_time
+        if dt <= 0:
+            dt = 1.0 / 30.0
+        if dt > self.reset_after:
+            self.reset()
+            return self(landmarks, timestamp)
+        self._last_time = timestamp
+
+        position = landmarks[:, 0:3]
+        previous = self._value[:, 0:3]
+
+        # Smoothed speed of each coordinate drives its cutoff frequency
+        derivative = (position - previous) / dt
+        a_d = _smoothing_factor(self.d_cutoff, dt)
+        self._derivative += a_d * (derivative - self._derivative)
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self._derivative)
+        tau = 1.0 / (2.0 * np.pi * cutoff)
+        alpha = 1.0 / (1.0 + tau / dt)
+
+        # Low-visibility landmarks move less toward the new measurement
+        visibility = np.clip(landmarks[:, 3:4], self.min_visibility, 1.0)
+        alpha = alpha * visibility
+
+        self._value[:, 0:3] = previous + alpha * (position - previous)
+        self._value[:, 3] = landmarks[:, 3]
+
+        return self._value.copy()
+
+
+class HoldDetector:
+    """
+    Hysteresis hold timer.
+
+    The hold starts once the score reaches enter_score and only breaks after
+    the score has been below exit_score for longer than grace_seconds, so a
+    single jittery frame no longer throws the hold away.
+    """
+
+    def __init__(self, enter_score=HOLD_ENTER_SCORE, exit_score=HOLD_EXIT_SCORE,
+                 grace_seconds=HOLD_GRACE_SECONDS, hold_seconds=HOLD_SECONDS):
+        self.enter_score = enter_score
+        self.exit_score = exit_score
+        self.grace_seconds = grace_seconds
+        self.hold_seconds = hold_seconds
+        self.reset()
+
+    def reset(self):
+        self.in_zone = False
+        self.zone_start = None
+        self._below_since = None
+
+    def held_for(self, timestamp=None):
+        if not self.in_zone:
+            return 0.0
+        if timestamp is None:
+            timestamp = time.time()
+        return timestamp - self.zone_start
+
+    def update(self, score, timestamp=None):
+        """Feed one score; returns True once the pose has been held for hold_seconds"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        if score >= self.enter_score or (self.in_zone and score >= self.exit_score):
+            if not self.in_zone:
+                self.in_zone = True
+                self.zone_start = timestamp
+            self._below_since = None
+        elif self.in_zone:
+            if self._below_since is None:
+                self._below_since = timestamp
+            elif timestamp - self._below_since > self.grace_seconds:
+                self.reset()
+
+        return self.in_zone and timestamp - self.zone_start >= self.hold_seconds
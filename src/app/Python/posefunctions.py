@@ -1,42 +1,261 @@
 import math
 
+import numpy as np
+
 DEADZONE = 0.35
+NUM_LANDMARKS = 33
 
-def calculate_pose_similarity(landmarks1, landmarks2):
+# Face landmarks are indices 0-10 (nose, eyes, ears, mouth);
+# the body starts at index 11 (left shoulder)
+BODY_LANDMARK_START = 11
+
+
+def landmarks_to_array(landmarks):
     """
-    Calculate similarity between two poses based on landmark distances.
+    Convert a MediaPipe NormalizedLandmarkList into a (33, 4) float32 array.
+    Columns are x, y, z, visibility. Returns None if no landmarks are given.
+    """
+    if landmarks is None:
+        return None
+
+    return np.array(
+        [(lm.x, lm.y, lm.z, lm.visibility) for lm in landmarks.landmark],
+        dtype=np.float32
+    )
+
+
+def array_to_landmarks(array):
+    """
+    Convert a (33, 4) landmark array back into a NormalizedLandmarkList
+    so it can be handed to mp_drawing.
+    """
+    if array is None:
+        return None
+
+    from mediapipe.framework.formats import landmark_pb2
+
+    landmark_list = landmark_pb2.NormalizedLandmarkList()
+    for x, y, z, visibility in array.tolist():
+        landmark_list.landmark.add(x=x, y=y, z=z, visibility=visibility)
+
+    return landmark_list
+
+def results_to_array(results):
+    """
+    Convert a MediaPipe Pose result into a (33, 4) landmark array.
+    Returns None if no pose was detected.
+    """
+    if results is None or not results.pose_landmarks:
+        return None
+
+    return landmarks_to_array(results.pose_landmarks)
+
+
+def as_landmark_array(landmarks):
+    """
+    Accept either a (33, 4) array or a NormalizedLandmarkList and return an array.
+    """
+    if landmarks is None or isinstance(landmarks, np.ndarray):
+        return landmarks
+
+    return landmarks_to_array(landmarks)
+
+
+def transform_landmarks(landmarks, offset_x=0.0, offset_y=0.0, scale=1.0, rotation=0.0, aspect_ratio=1.0):
+    """
+    Apply the overlay offset and scale (scaled from center point 0.5, 0.5)
+    to a landmark array. Returns a new array; visibility is left unchanged.
+
+    rotation is in radians around the center point. Normalized x and y are
+    not the same length in pixels, so rotation is applied in image space
+    using aspect_ratio (frame width / height).
+    """
+    if landmarks is None:
+        return None
+
+    adjusted = np.empty_like(landmarks)
+    adjusted[..., 0:2] = (landmarks[..., 0:2] - 0.5) * scale
+    if rotation:
+        cos_r, sin_r = math.cos(rotation), math.sin(rotation)
+        dx = adjusted[..., 0] * aspect_ratio
+        dy = adjusted[..., 1].copy()
+        adjusted[..., 0] = (cos_r * dx - sin_r * dy) / aspect_ratio
+        adjusted[..., 1] = sin_r * dx + cos_r * dy
+    adjusted[..., 0] += 0.5 + offset_x
+    adjusted[..., 1] += 0.5 + offset_y
+    adjusted[..., 2] = landmarks[..., 2] * scale
+    adjusted[..., 3] = landmarks[..., 3]
+
+    return adjusted
+
+
+def fit_similarity_transform(landmarks_source, landmarks_target, allow_rotation=False, aspect_ratio=1.0):
+    """
+    Least-squares similarity transform (Procrustes) that maps the source
+    landmarks onto the target landmarks.
+
+    Only body landmarks (11-32) are used, each weighted by the product of its
+    visibility in both poses, so occluded joints barely pull on the fit.
+
+    Args:
+        landmarks_source: The pose landmarks to be transformed (e.g., saved pose)
+        landmarks_target: The reference pose landmarks (e.g., live camera feed)
+        allow_rotation: also solve for an in-plane rotation
+        aspect_ratio: frame width / height, used to fit in image space
+
+    Returns:
+        tuple: (offset_x, offset_y, scale, rotation) in the convention used by
+        transform_landmarks. Falls back to the identity if the fit is degenerate.
+    """
+    identity = (0.0, 0.0, 1.0, 0.0)
+    if landmarks_source is None or landmarks_target is None:
+        return identity
+
+    source = landmarks_source[BODY_LANDMARK_START:]
+    target = landmarks_target[BODY_LANDMARK_START:]
+
+    weights = np.clip(source[:, 3], 0.0, 1.0) * np.clip(target[:, 3], 0.0, 1.0)
+    total_weight = weights.sum()
+    if total_weight < 1e-6:
+        return identity
+
+    # Work in image space centered on (0.5, 0.5) so rotation is not skewed
+    image_scale = np.array([aspect_ratio, 1.0], dtype=np.float64)
+    src = (source[:, 0:2].astype(np.float64) - 0.5) * image_scale
+    dst = (target[:, 0:2].astype(np.float64) - 0.5) * image_scale
+
+    src_mean = weights @ src / total_weight
+    dst_mean = weights @ dst / total_weight
+    src_c = src - src_mean
+    dst_c = dst - dst_mean
+
+    src_var = weights @ (src_c ** 2).sum(axis=1)
+    if src_var < 1e-9:
+        return identity
+
+    # a = sum w (src . dst), b = sum w (src x dst)
+    a = weights @ (src_c * dst_c).sum(axis=1)
+    if allow_rotation:
+        b = weights @ (src_c[:, 0] * dst_c[:, 1] - src_c[:, 1] * dst_c[:, 0])
+        rotation = math.atan2(b, a)
+        scale = math.hypot(a, b) / src_var
+    else:
+        rotation = 0.0
+        scale = a / src_var
+
+    if scale <= 0:
+        return identity
+
+    # dst = scale * R(src - src_mean) + dst_mean = scale * R(src) + offset
+    cos_r, sin_r = math.cos(rotation), math.sin(rotation)
+    rotated_mean = np.array([
+        cos_r * src_mean[0] - sin_r * src_mean[1],
+        sin_r * src_mean[0] + cos_r * src_mean[1]
+    ])
+    offset = (dst_mean - scale * rotated_mean) / image_scale
+
+    return float(offset[0]), float(offset[1]), float(scale), rotation
+
+
+def landmark_distances(landmarks1, landmarks2):
+    """
+    Euclidean (x, y, z) distance between corresponding landmarks.
+    Works on (33, 4) arrays or any stack of them that broadcasts.
+    """
+    diff = landmarks1[..., 0:3] - landmarks2[..., 0:3]
+    return np.sqrt(np.einsum('...i,...i->...', diff, diff))
+
+
+def pose_similarity(landmarks1, landmarks2, deadzone=0.0, body_only=False):
+    """
+    Calculate similarity between two landmark arrays.
     Returns a score from 0-100, where 100 is a perfect match.
+
+    Args:
+        landmarks1, landmarks2: (33, 4) landmark arrays
+        deadzone: per-landmark distance that is ignored before averaging
+        body_only: exclude face landmarks (0-10) to focus on body pose
     """
     if landmarks1 is None or landmarks2 is None:
         return 0.0
-    
-    total_distance = 0.0
-    num_landmarks = len(landmarks1.landmark)
-    
-    for i in range(num_landmarks):
-        lm1 = landmarks1.landmark[i]
-        lm2 = landmarks2.landmark[i]
-        
-        # Calculate Euclidean distance between corresponding landmarks
-        distance = math.sqrt(
-            (lm1.x - lm2.x) ** 2 + 
-            (lm1.y - lm2.y) ** 2 + 
-            (lm1.z - lm2.z) ** 2
-        )
-        distance -= DEADZONE
-        distance = max(0, distance)
-        total_distance += distance
-    
-    # Average distance per landmark
-    avg_distance = total_distance / num_landmarks
-    # avg_distance = min(0.2, avg_distance)
 
+    distances = landmark_distances(landmarks1, landmarks2)
+    if body_only:
+        distances = distances[..., BODY_LANDMARK_START:]
+    if deadzone:
+        distances = np.maximum(distances - deadzone, 0.0)
 
-    # Convert to similarity score (0-100)
+    # Average distance per landmark, converted to a 0-100 score
     # Assuming max reasonable distance is 1.0 (full diagonal of normalized space)
-    similarity = max(0, 100 - (avg_distance * 100))
-    
-    return similarity
+    avg_distance = distances.mean(axis=-1)
+    similarity = np.maximum(0.0, 100.0 - avg_distance * 100.0)
+
+    return float(similarity) if np.ndim(similarity) == 0 else similarity
+
+
+def normalize_landmarks(landmarks):
+    """
+    Remove position and size from a landmark array (or a stack of them)
+    by centering on the body centroid and dividing by the body's RMS radius.
+    Only x and y are normalized; z is scaled by the same factor.
+    """
+    body = landmarks[..., BODY_LANDMARK_START:, 0:2]
+    centroid = body.mean(axis=-2, keepdims=True)
+    radius = np.sqrt(((body - centroid) ** 2).sum(axis=-1).mean(axis=-1))
+    radius = np.maximum(radius, 1e-6)[..., np.newaxis, np.newaxis]
+
+    normalized = landmarks.copy()
+    normalized[..., 0:2] = (landmarks[..., 0:2] - centroid) / radius
+    normalized[..., 2:3] = landmarks[..., 2:3] / radius
+
+    return normalized
+
+
+def score_against_references(live_landmarks, reference_stack, body_only=True, normalize=True):
+    """
+    Score one live pose against many reference poses in a single call.
+
+    Args:
+        live_landmarks: (33, 4) landmark array for the live frame
+        reference_stack: (N, 33, 4) stack of reference landmark arrays
+        body_only: exclude face landmarks (0-10)
+        normalize: compare poses independent of where and how large the
+                   person is in frame (needed when nothing is aligned yet)
+
+    With normalize, distances are measured in units of the body's RMS
+    radius rather than the frame, so the 0-100 scores are on a different
+    scale from the accuracy of an aligned pose (calculate_pose_similarity_wo_face)
+    and only comparable with each other.
+
+    Returns:
+        tuple: (scores, best_index)
+        - scores: (N,) array of 0-100 similarity scores
+        - best_index: index of the best matching reference, or -1 if none
+    """
+    if live_landmarks is None or reference_stack is None or len(reference_stack) == 0:
+        return np.zeros(0, dtype=np.float32), -1
+
+    if normalize:
+        live_landmarks = normalize_landmarks(live_landmarks)
+        reference_stack = normalize_landmarks(reference_stack)
+
+    scores = pose_similarity(live_landmarks[np.newaxis], reference_stack, body_only=body_only)
+    scores = np.atleast_1d(scores)
+
+    return scores, int(np.argmax(scores))
+
+
+def calculate_pose_similarity(landmarks1, landmarks2):
+    """
+    Calculate similarity between two poses based on landmark distances.
+    Returns a score from 0-100, where 100 is a perfect match.
+    Accepts landmark arrays or NormalizedLandmarkLists.
+    """
+    return pose_similarity(
+        as_landmark_array(landmarks1),
+        as_landmark_array(landmarks2),
+        deadzone=DEADZONE
+    )
 
 
 def calculate_pose_similarity_wo_face(landmarks1, landmarks2):
@@ -44,38 +263,13 @@ def calculate_pose_similarity_wo_face(landmarks1, landmarks2):
     Calculate similarity between two poses based on landmark distances.
     Returns a score from 0-100, where 100 is a perfect match.
     Excludes face landmarks (0-10) to focus on body pose.
+    Accepts landmark arrays or NormalizedLandmarkLists.
     """
-    if landmarks1 is None or landmarks2 is None:
-        return 0.0
-    
-    # Exclude face landmarks (indices 0-10: nose, eyes, ears, mouth)
-    # Start from index 11 (left shoulder) onwards
-    body_landmark_start = 11
-    
-    total_distance = 0.0
-    num_landmarks = 0
-    
-    for i in range(body_landmark_start, len(landmarks1.landmark)):
-        lm1 = landmarks1.landmark[i]
-        lm2 = landmarks2.landmark[i]
-        
-        # Calculate Euclidean distance between corresponding landmarks
-        distance = math.sqrt(
-            (lm1.x - lm2.x) ** 2 + 
-            (lm1.y - lm2.y) ** 2 + 
-            (lm1.z - lm2.z) ** 2
-        )
-        total_distance += distance
-        num_landmarks += 1
-    
-    # Average distance per landmark
-    avg_distance = total_distance / num_landmarks
-    
-    # Convert to similarity score (0-100)
-    # Assuming max reasonable distance is 1.0 (full diagonal of normalized space)
-    similarity = max(0, 100 - (avg_distance * 100))
-    
-    return similarity
+    return pose_similarity(
+        as_landmark_array(landmarks1),
+        as_landmark_array(landmarks2),
+        body_only=True
+    )
 
 
 # def calculate_alignment(landmarks_source, landmarks_target):
@@ -212,6 +406,7 @@ def calculate_alignment(landmarks_source, landmarks_target):
     Args:
         landmarks_source: The pose landmarks to be transformed (e.g., saved pose)
         landmarks_target: The reference pose landmarks (e.g., live camera feed)
+        Either may be a (33, 4) array or a NormalizedLandmarkList.
     
     Returns:
         tuple: (offset_x, offset_y, scale)
@@ -220,59 +415,15 @@ def calculate_alignment(landmarks_source, landmarks_target):
         - scale: scale factor to apply to source
         
     Method:
-        - Offset calculated from HEAD position (nose landmark)
-        - Scale calculated from BODY HEIGHT (nose to ankles)
+        - Visibility-weighted least-squares fit over the body landmarks
+          (see fit_similarity_transform), without rotation
     """
     if landmarks_source is None or landmarks_target is None:
         return 0.0, 0.0, 1.0
-    
-    # ====================================
-    # OFFSET: Based on HEAD (nose) position
-    # ====================================
-    nose_index = 0  # Nose landmark
-    
-    # Get nose positions for both poses
-    source_nose_x = landmarks_source.landmark[nose_index].x
-    source_nose_y = landmarks_source.landmark[nose_index].y
-    target_nose_x = landmarks_target.landmark[nose_index].x
-    target_nose_y = landmarks_target.landmark[nose_index].y
-    
-    # ====================================
-    # SCALE: Based on BODY HEIGHT
-    # ====================================
-    # Calculate height as distance from nose to average of ankles
-    left_ankle_index = 27
-    right_ankle_index = 28
-    
-    # Source height calculation
-    source_left_ankle_y = landmarks_source.landmark[left_ankle_index].y
-    source_right_ankle_y = landmarks_source.landmark[right_ankle_index].y
-    source_ankle_avg_y = (source_left_ankle_y + source_right_ankle_y) / 2
-    source_height = abs(source_ankle_avg_y - source_nose_y)
-    
-    # Target height calculation
-    target_left_ankle_y = landmarks_target.landmark[left_ankle_index].y
-    target_right_ankle_y = landmarks_target.landmark[right_ankle_index].y
-    target_ankle_avg_y = (target_left_ankle_y + target_right_ankle_y) / 2
-    target_height = abs(target_ankle_avg_y - target_nose_y)
-    
-    # Calculate scale factor based on height ratio
-    if source_height > 0.01:  # Avoid division by very small numbers
-        scale = target_height / source_height
-    else:
-        scale = 1.0
-    
-    # ====================================
-    # Calculate offset (after scaling from center point 0.5, 0.5)
-    # ====================================
-    # First, apply scale to source nose position
-    scaled_source_nose_x = (source_nose_x - 0.5) * scale + 0.5
-    scaled_source_nose_y = (source_nose_y - 0.5) * scale + 0.5
-    
-    # Then calculate offset needed to align scaled source nose to target nose
-    offset_x = target_nose_x - scaled_source_nose_x
-    offset_y = target_nose_y - scaled_source_nose_y
-    
-    return offset_x, offset_y, scale
 
+    offset_x, offset_y, scale, _ = fit_similarity_transform(
+        as_landmark_array(landmarks_source),
+        as_landmark_array(landmarks_target)
+    )
 
+    return offset_x, offset_y, scale
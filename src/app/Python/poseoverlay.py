@@ -0,0 +1,142 @@
+"""
+Vectorized pose overlay drawing.
+
+mp_drawing.draw_landmarks converts every landmark to a protobuf, loops over
+the connections in Python and draws each limb and joint with its own
+OpenCV call. Here the connection index arrays are built once, a whole
+(33, 4) landmark array is converted to pixels in one NumPy op, and each
+pose is drawn with one cv2.polylines call for the limbs and one for the
+joints. Once the alignment is frozen the reference pose only changes
+with the frame size, so OverlayRenderer keeps it as a cached layer and
+just copies its pixels onto each frame.
+"""
+import cv2
+import mediapipe as mp
+import numpy as np
+
+# (n, 2) landmark index pairs, built once
+POSE_CONNECTIONS = np.array(sorted(mp.solutions.pose.POSE_CONNECTIONS), dtype=np.intp)
+
+# Same cutoff mp_drawing uses for hiding landmarks
+VISIBILITY_THRESHOLD = 0.5
+
+REFERENCE_COLOR = (0, 0, 255)  # Red
+LIVE_COLOR = (0, 255, 0)  # Green
+LINE_THICKNESS = 2
+# Joints are drawn as filled dots this wide (about mp_drawing's radius 2 circles)
+JOINT_SIZE = 5
+
+
+def landmark_pixels(landmarks, width, height):
+    """
+    Pixel coordinates of a (33, 4) landmark array.
+
+    Returns:
+        tuple: (points, visible)
+        - points: (33, 2) int32 pixel coordinates
+        - visible: (33,) bool, False for low-visibility or off-frame landmarks
+    """
+    xy = landmarks[:, 0:2]
+    visible = (
+        (landmarks[:, 3] >= VISIBILITY_THRESHOLD)
+        & np.all(xy >= 0.0, axis=1) & np.all(xy <= 1.0, axis=1)
+    )
+    points = np.floor(xy * (width, height)).astype(np.int32)
+    np.minimum(points, (width - 1, height - 1), out=points)
+    return points, visible
+
+
+def draw_pose(img, landmarks, color):
+    """Draw one pose's limbs and joints onto img in place"""
+    height, width = img.shape[:2]
+    points, visible = landmark_pixels(landmarks, width, height)
+
+    # Limbs: only connections with both ends visible, all in one call
+    limbs = POSE_CONNECTIONS[visible[POSE_CONNECTIONS].all(axis=1)]
+    if len(limbs):
+        cv2.polylines(img, list(points[limbs]), False, color, LINE_THICKNESS)
+
+    # Joints: zero-length thick segments are drawn as round dots
+    joints = points[visible]
+    if len(joints):
+        cv2.polylines(img, list(np.repeat(joints[:, None, :], 2, axis=1)), False, color, JOINT_SIZE)
+
+
+def draw_score(img, accuracy):
+    # Display accuracy with color coding
+    if accuracy >= 80:
+        color = (0, 255, 0)  # Green
+    elif accuracy >= 60:
+        color = (0, 255, 255)  # Yellow
+    else:
+        color = (0, 0, 255)  # Red
+
+    cv2.putText(img, f"Match: {accuracy:.1f}%", (10, 30),
+               cv2.FONT_HERSHEY_SIMPLEX, 1.0, color, 3)
+
+
+class OverlayRenderer:
+    """
+    Draws the reference pose (red), live pose (green) and match score for
+    one session.
+
+    While calibrating, auto-align moves the reference every frame, so it is
+    drawn straight onto the frame. Once the same alignment and frame size
+    come twice in a row, the reference is rendered into a layer stored as
+    the byte indices and values of the pixels it covers, and drawing it is a
+    single fancy-indexed assignment until the alignment changes again.
+    Safe to share between render threads: the cache is replaced as one tuple.
+    """
+
+    def __init__(self):
+        # (key, flat byte indices, values) of the cached reference layer
+        self._reference = None
+        # Key of the last reference drawn without the cache
+        self._last_key = None
+
+    def reset(self):
+        self._reference = None
+        self._last_key = None
+
+    def _reference_layer(self, key, shape, adjusted_array):
+        layer = np.zeros(shape, dtype=np.uint8)
+        draw_pose(layer, adjusted_array, REFERENCE_COLOR)
+        # Byte (not pixel) indices: scalar fancy indexing is several times
+        # faster than assigning whole pixel rows
+        pixels = np.flatnonzero(layer.reshape(-1, shape[2]).any(axis=1))
+        indices = (pixels[:, None] * shape[2] + np.arange(shape[2])).ravel()
+        cached = (key, indices, layer.reshape(-1)[indices])
+        self._reference = cached
+        return cached
+
+    def draw(self, img, adjusted_array, live_array, accuracy):
+        """Draw the overlays and match score on a copy of the frame"""
+        display_frame = img.copy()
+
+        # Reference pose (in RED) with offset and scale
+        if adjusted_array is not None:
+            key = (display_frame.shape, adjusted_array.tobytes())
+            cached = self._reference
+            if cached is None or cached[0] != key:
+                if key == self._last_key:
+                    # Stable for two frames: alignment is probably frozen
+                    cached = self._reference_layer(key, display_frame.shape, adjusted_array)
+                else:
+                    self._last_key = key
+                    cached = None
+
+            if cached is not None:
+                _, indices, values = cached
+                display_frame.reshape(-1)[indices] = values
+            else:
+                draw_pose(display_frame, adjusted_array, REFERENCE_COLOR)
+
+        # Live pose (in GREEN)
+        if live_array is not None:
+            draw_pose(display_frame, live_array, LIVE_COLOR)
+
+        if accuracy is not None:
+            draw_score(display_frame, accuracy)
+
+        return display_frame
+
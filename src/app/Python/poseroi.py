@@ -0,0 +1,121 @@
+"""
+Adaptive inference input: downsampling and ROI cropping around the body.
+
+MediaPipe resizes everything to its own small model input anyway, so
+feeding it full webcam frames mostly costs color conversion and resize
+time. AdaptiveInput crops each frame to a padded box around the previous
+frame's landmarks (once a pose is tracked), shrinks the crop to at most
+inference_size pixels on its long side, and maps the resulting landmarks
+back to full-frame normalized coordinates.
+"""
+import cv2
+import numpy as np
+
+import posefunctions
+
+# Long side of the image passed to pose.process (None = never downsample)
+INFERENCE_SIZE = 480
+# Padding around the landmark bounding box, as a fraction of its long side
+ROI_PADDING = 0.3
+# Landmarks below this visibility don't count toward the bounding box
+ROI_MIN_VISIBILITY = 0.5
+# Crops covering more of the frame than this just use the full frame
+ROI_MAX_AREA = 0.8
+
+
+class AdaptiveInput:
+    """
+    Per-session input stage in front of pose.process.
+
+    The crop is only moved when the body gets close to its edge, so for a
+    mostly still user MediaPipe keeps seeing the same window and its own
+    tracking stays valid between frames.
+    """
+
+    def __init__(self, inference_size=INFERENCE_SIZE, use_roi=True, padding=ROI_PADDING,
+                 min_visibility=ROI_MIN_VISIBILITY):
+        self.inference_size = inference_size
+        self.use_roi = use_roi
+        self.padding = padding
+        self.min_visibility = min_visibility
+        self.reset()
+
+    def reset(self):
+        # (x0, y0, x1, y1) in pixels of the full frame, or None for the whole frame
+        self.roi = None
+
+    def prepare(self, img):
+        """
+        Crop and downsample a BGR frame.
+
+        Returns:
+            tuple: (input_img, window)
+            - input_img: image to run inference on
+            - window: (x0, y0, width, height) of the crop in full-frame pixels
+        """
+        height, width = img.shape[:2]
+        x0, y0, x1, y1 = self.roi if self.roi is not None else (0, 0, width, height)
+        crop = img[y0:y1, x0:x1]
+
+        crop_height, crop_width = crop.shape[:2]
+        longest = max(crop_width, crop_height)
+        if self.inference_size and longest > self.inference_size:
+            factor = self.inference_size / longest
+            crop = cv2.resize(
+                crop,
+                (max(1, round(crop_width * factor)), max(1, round(crop_height * factor))),
+                interpolation=cv2.INTER_AREA
+            )
+
+        return crop, (x0, y0, crop_width, crop_height)
+
+    def restore(self, landmarks, window, shape):
+        """Map crop-normalized landmarks back to full-frame normalized coordinates"""
+        if landmarks is None:
+            return None
+
+        x0, y0, crop_width, crop_height = window
+        height, width = shape[:2]
+        if (x0, y0, crop_width, crop_height) == (0, 0, width, height):
+            return landmarks
+
+        restored = landmarks.copy()
+        restored[:, 0] = (landmarks[:, 0] * crop_width + x0) / width
+        restored[:, 1] = (landmarks[:, 1] * crop_height + y0) / height
+        # z shares x's scale (normalized by image width)
+        restored[:, 2] = landmarks[:, 2] * crop_width / width
+        return restored
+
+    def update(self, landmarks, shape):
+        """Choose the next frame's crop from this frame's full-frame landmarks"""
+        if not self.use_roi or landmarks is None:
+            self.roi = None
+            return
+
+        height, width = shape[:2]
+        body = landmarks[posefunctions.BODY_LANDMARK_START:]
+        visible = body[body[:, 3] >= self.min_visibility]
+        if len(visible) < 4:
+            self.roi = None
+            return
+
+        bx0, by0 = visible[:, 0].min() * width, visible[:, 1].min() * height
+        bx1, by1 = visible[:, 0].max() * width, visible[:, 1].max() * height
+
+        # Keep the current crop while the body stays well inside it
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            margin = 0.5 * self.padding * max(bx1 - bx0, by1 - by0)
+            if bx0 - margin >= x0 and by0 - margin >= y0 and bx1 + margin <= x1 and by1 + margin <= y1:
+                return
+
+        pad = self.padding * max(bx1 - bx0, by1 - by0)
+        x0 = int(np.clip(bx0 - pad, 0, width))
+        y0 = int(np.clip(by0 - pad, 0, height))
+        x1 = int(np.clip(bx1 + pad, 0, width))
+        y1 = int(np.clip(by1 + pad, 0, height))
+
+        if x1 - x0 < 16 or y1 - y0 < 16 or (x1 - x0) * (y1 - y0) > ROI_MAX_AREA * width * height:
+            self.roi = None
+        else:
+            self.roi = (x0, y0, x1, y1)
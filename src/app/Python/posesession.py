@@ -0,0 +1,590 @@
+import threading
+import time
+from collections import deque
+
+import posefunctions
+import frametransport
+import inference
+import metrics
+from exercisestate import STATUS_CALIBRATING, STATUS_HOLDING
+from scorestats import StreamingScoreStats
+from posefilters import LandmarkFilter, HoldDetector
+from frameskip import FrameSkipper
+from stagepipeline import StagedPipeline
+from poseoverlay import OverlayRenderer
+
+# Solve for in-plane rotation as well when auto-aligning
+ALLOW_ROTATION = False
+
+# Pause after a completed hold before the next exercise can start
+REST_SECONDS = 2.0
+
+# Client clock offsets are estimated over this many recent seconds
+CLOCK_WINDOW = 10.0
+# A client clock that stepped backward makes every frame look late by the
+# step; after RESYNC_FRAMES frames in a row older than RESYNC_FACTOR times
+# the age budget, the offset is estimated afresh
+RESYNC_FACTOR = 4.0
+RESYNC_FRAMES = 15
+
+# InferenceResult.error -> (metrics counter, frame_dropped reason)
+INFERENCE_FAILURES = {
+    'decode': ('decode_failures', 'decode_failed'),
+    'too_large': ('oversize_frames', 'too_large'),
+    'error': ('inference_errors', 'error'),
+}
+
+
+class CaptureClock:
+    """
+    Maps client capture times onto the server's monotonic clock.
+
+    The offset is the smallest (server arrival - client capture) over the
+    last CLOCK_WINDOW seconds: the client's clock offset plus the fastest
+    recent transit, so ages are delays beyond the best case. Only keeping a
+    window lets the offset move up again after the client clock steps
+    backward (NTP, sleep/resume); server clock steps don't matter since
+    arrival times are monotonic.
+    """
+
+    def __init__(self, window=CLOCK_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        # (arrival, offset) pairs with increasing offsets: the first is the minimum
+        self._samples = deque()
+        self._far_behind = 0
+
+    def add(self, captured_at, arrival):
+        """Record a frame captured at captured_at (client s) arriving at arrival (monotonic s)"""
+        offset = arrival - captured_at
+        with self._lock:
+            while self._samples and self._samples[-1][1] >= offset:
+                self._samples.pop()
+            self._samples.append((arrival, offset))
+            while self._samples[0][0] < arrival - self.window:
+                self._samples.popleft()
+
+    def age(self, captured_at, limit=None):
+        """
+        Seconds since capture, or None without an estimate. With a limit,
+        ages past RESYNC_FACTOR * limit are counted and the estimate is
+        dropped (None returned) once RESYNC_FRAMES come in a row.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not self._samples:
+                return None
+            age = now - captured_at - self._samples[0][1]
+            if limit is None:
+                return age
+            if age <= limit * RESYNC_FACTOR:
+                self._far_behind = 0
+                return age
+            self._far_behind += 1
+            if self._far_behind < RESYNC_FRAMES:
+                return age
+            self._samples.clear()
+            self._far_behind = 0
+        print(f"⚠️  Frames {age * 1000:.0f} ms late for too long, re-estimating the client clock")
+        return None
+
+
+class PoseSession:
+    """
+    Everything the server keeps for one connected client: its frame slot,
+    overlay alignment, hold scores and exercise state. Its MediaPipe tracker
+    lives in the inference backend, keyed by sid.
+
+    Frames are processed either by the shared worker pool (process_next,
+    at most one worker per session at a time) or by the session's own
+    StagedPipeline (start_pipeline). Either way the tracker sees that
+    client's frames one at a time and in order.
+    """
+
+    def __init__(self, sid, backend, pose_cache, exercises, catalog_names=None, catalog_stack=None,
+                 recorder=None, send_timing=False, max_frame_age=None, on_dropped=None):
+        self.sid = sid
+        self.backend = backend
+        self.pose_cache = pose_cache
+        # Shared ExerciseStateMachine for the exercises table
+        self.exercises = exercises
+        # Latest frame waiting for a worker (latest frame wins). Swapped and
+        # taken under slot_lock, so a replaced frame is always reported dropped
+        self.waiting_frame = None
+        self.slot_lock = threading.Lock()
+        self.active = True
+        # Set by start_pipeline; replaces waiting_frame and the worker pool
+        self.pipeline = None
+
+        # Held while a worker processes this session's frame
+        self.lock = threading.Lock()
+        # Guards the scheduled flag used by the worker pool
+        self.schedule_lock = threading.Lock()
+        self.scheduled = False
+
+        # Pose adjustment
+        self.offset_x = 0.0
+        self.offset_y = 0.0
+        self.scale = 1.0
+        self.rotation = 0.0
+        # Fit offset/scale to the live pose every calibration frame instead of
+        # waiting for manual adjust_pose nudges
+        self.auto_align = True
+        # 'image' sends back an annotated JPEG, 'landmarks' sends only the live and
+        # adjusted reference landmarks so the client can draw the overlay itself
+        self.response_mode = 'image'
+
+        # Exercise state, mirrored from the state machine each frame
+        self.exercise_id = None
+        self.exercise = None
+        self.category = None
+        self.status = 0
+        self.posefile = 't_pose.jpg'
+        self.saved_array = pose_cache.get(self.posefile, backend.config.model)
+        self.pose_loaded = False
+        self.rest_until = 0.0
+        # Temporal smoothing of live landmarks and hysteresis hold timer
+        self.smoother = LandmarkFilter()
+        self.hold = HoldDetector()
+        # Samples are weighted by time, so skipped or dropped frames don't skew the mean
+        self.scores = StreamingScoreStats(time_weighted=True)
+        # Runs full inference only every k-th frame while latency is over budget
+        self.skipper = FrameSkipper()
+        self.frame_shape = None
+        # Keeps the reference overlay layer between frames
+        self.overlay = OverlayRenderer()
+
+        # Reference stack for automatic exercise recognition
+        self.catalog_names = catalog_names or []
+        self.catalog_stack = catalog_stack
+
+        # Optional SessionRecorder capturing incoming frames and their results
+        self.recorder = recorder
+
+        # Add per-stage timings (ms) to every processed_frame
+        self.send_timing = send_timing
+        # PipelineConfig this session's tracker is built with
+        self.pipeline_config = backend.config
+        # FrameTimer of the last processed frame; the worker adds the emit span
+        self.last_timer = None
+
+        # Frames older than this (seconds, see frame_age) are dropped before
+        # decoding; None processes every frame however late
+        self.max_frame_age = max_frame_age
+        # Called as on_dropped(session, frame_data, reason) for each frame that
+        # won't get a processed_frame, so the client gets its credit back
+        self.on_dropped = on_dropped
+        # Client capture times on the server clock, for frame_age
+        self.capture_clock = CaptureClock()
+
+        self.num_frames = -1
+
+    def submit(self, data):
+        """Queue a frame, replacing the waiting one if the session is behind"""
+        data['received_at'] = time.perf_counter()
+        metrics.registry.increment('frames_received')
+
+        if not isinstance(data.get('seq'), int):
+            data.pop('seq', None)
+        captured_at = data.get('captured_at')
+        if not isinstance(captured_at, (int, float)):
+            data.pop('captured_at', None)
+        else:
+            self.capture_clock.add(captured_at / 1000.0, time.monotonic())
+        if self.recorder is not None:
+            data['recorded_index'] = self.recorder.record_frame(
+                data['image'], seq=data.get('seq'), captured_at=data.get('captured_at')
+            )
+
+        if self.pipeline is not None:
+            superseded = self.pipeline.submit(data)
+        else:
+            with self.slot_lock:
+                superseded, self.waiting_frame = self.waiting_frame, data
+
+        if superseded is not None:
+            metrics.registry.increment('frames_dropped')
+            self._drop(superseded, 'superseded')
+
+    def _drop(self, frame_data, reason):
+        """A frame won't get a processed_frame: tell on_dropped why"""
+        if self.on_dropped is not None:
+            self.on_dropped(self, frame_data, reason)
+
+    def has_frames(self):
+        return self.waiting_frame is not None
+
+    def adjust(self, action):
+        """Handle pose adjustment controls from frontend"""
+        # 'auto_align' turns automatic alignment on; any manual nudge turns it off
+        if action == 'auto_align':
+            self.auto_align = True
+        elif action != 'reset':
+            self.auto_align = False
+
+        if action == 'move_up':
+            self.offset_y -= 0.01
+        elif action == 'move_down':
+            self.offset_y += 0.01
+        elif action == 'move_left':
+            self.offset_x -= 0.01
+        elif action == 'move_right':
+            self.offset_x += 0.01
+        elif action == 'scale_up':
+            self.scale += 0.05
+        elif action == 'scale_down':
+            self.scale = max(0.1, self.scale - 0.05)
+        elif action == 'reset':
+            self.offset_x = 0.0
+            self.offset_y = 0.0
+            self.scale = 1.0
+            self.rotation = 0.0
+
+        return {
+            'offset_x': self.offset_x,
+            'offset_y': self.offset_y,
+            'scale': self.scale,
+            'rotation': self.rotation,
+            'auto_align': self.auto_align
+        }
+
+    def configure(self, config):
+        """Switch this session to another PipelineConfig (rebuilds its tracker)"""
+        with self.lock:
+            self.backend.configure(self.sid, config)
+            model_changed = config.model != self.pipeline_config.model
+            self.pipeline_config = config
+            self.smoother.reset()
+            self.skipper.reset()
+
+            # References must come from the model this session now runs
+            if model_changed:
+                self.saved_array = self.pose_cache.get(self.posefile, config.model)
+                if self.catalog_stack is not None:
+                    self.catalog_names, self.catalog_stack = self.pose_cache.get_stack(
+                        self.catalog_names, config.model
+                    )
+
+    def start_pipeline(self, on_output, decode_threads=1, render_threads=1, buffer_size=2):
+        """
+        Process this session's frames in an overlapping decode -> analyze ->
+        render pipeline instead of the shared worker pool. on_output(session,
+        job) is called with each finished frame, in arrival order.
+        """
+        self.pipeline = StagedPipeline(
+            [
+                ('decode', self.decode_frame, decode_threads),
+                # Tracker and exercise state: always a single thread
+                ('analyze', self._analyze_locked, 1),
+                ('render', self.render_frame, render_threads)
+            ],
+            on_output=lambda job: on_output(self, job),
+            buffer_size=buffer_size,
+            name=f"Session-{self.sid[:8]}",
+            # Stage input is the frame itself (decode) or its job (later stages)
+            on_error=lambda item, error: self._drop(item.get('frame', item), 'error')
+        )
+
+    def _analyze_locked(self, job):
+        with self.lock:
+            if not self.active:
+                self._drop(job['frame'], 'closed')
+                return None
+            return self.analyze_frame(job)
+
+    def close(self):
+        self.active = False
+        if self.pipeline is not None:
+            self.pipeline.close()
+        with self.lock:
+            self.backend.release(self.sid)
+            if self.recorder is not None:
+                self.recorder.close()
+
+    def process_next(self):
+        """
+        Process the next queued frame, if any.
+        Returns the processed_frame payload, or None if there was nothing to send.
+        """
+        with self.lock:
+            if not self.active:
+                return None
+
+            with self.slot_lock:
+                frame_data, self.waiting_frame = self.waiting_frame, None
+            if frame_data is None:
+                return None
+
+            try:
+                return self._process_frame(frame_data)
+            except Exception:
+                self._drop(frame_data, 'error')
+                raise
+
+    def frame_age(self, frame_data, limit=None):
+        """
+        Seconds a frame has been waiting, as far as the server can tell.
+
+        A client capture time (captured_at, ms since the epoch) is mapped
+        through the session's CaptureClock (limit is passed on to it).
+        Frames without captured_at, or without a clock estimate, count from
+        their arrival.
+        """
+        captured_at = frame_data.get('captured_at')
+        if captured_at is not None:
+            age = self.capture_clock.age(captured_at / 1000.0, limit)
+            if age is not None:
+                return age
+        return time.perf_counter() - frame_data['received_at']
+
+    def _refresh_exercise(self):
+        """Pick up the active exercise from the shared state machine"""
+        current = self.exercises.current()
+        if current.id != self.exercise_id:
+            # New exercise: load its reference pose and start a fresh hold
+            self.pose_loaded = False
+            self.scores.reset()
+            self.hold.reset()
+        self.exercise_id, self.exercise, self.category, self.status = current
+
+        if self.exercise is not None:
+            self.posefile = f'{self.exercise}_pose.jpg'
+
+        if self.num_frames % 30 == 0:
+            print(f"[{self.sid}] status: {self.status}, excercise:{self.exercise}, file:{self.posefile}")
+
+        if not self.pose_loaded:
+            self.saved_array = self.pose_cache.get(self.posefile, self.pipeline_config.model)
+            # Missing or undetectable pose images are retried on the
+            # next frame instead of spinning here
+            self.pose_loaded = self.saved_array is not None
+
+    def _process_frame(self, frame_data):
+        """Run all three stages for one frame; returns the processed_frame payload or None"""
+        job = self.decode_frame(frame_data)
+        if job is not None:
+            job = self.analyze_frame(job)
+        if job is not None:
+            job = self.render_frame(job)
+        if job is None:
+            return None
+        return job['response']
+
+    def decode_frame(self, frame_data):
+        """
+        Decode stage: no session state is touched, so it can run on any
+        thread, ahead of the frame currently being analyzed.
+        """
+        # Too old to be worth decoding: a newer frame is on its way
+        if self.max_frame_age is not None:
+            age = self.frame_age(frame_data, limit=self.max_frame_age)
+            if age > self.max_frame_age:
+                metrics.registry.increment('stale_frames')
+                self._drop(frame_data, 'stale')
+                return None
+
+        timer = metrics.FrameTimer(start=frame_data.get('received_at'))
+        timer.add('queue_wait', time.perf_counter() - timer.start)
+        job = {
+            'frame': frame_data,
+            'timer': timer,
+            'binary': frametransport.is_binary(frame_data['image']),
+            'response_mode': self.response_mode,
+            'prepared': None
+        }
+
+        # In landmarks mode skipped frames are never decoded, so leave it to analyze
+        if job['response_mode'] != 'landmarks':
+            with timer.span('decode'):
+                job['prepared'] = self.backend.prepare(frame_data['image'])
+            if job['prepared'] is None:
+                print("⚠️ Failed to decode image")
+                metrics.registry.increment('decode_failures')
+                self._drop(frame_data, 'decode_failed')
+                return None
+
+        return job
+
+    def analyze_frame(self, job):
+        """
+        Inference and scoring stage: runs this session's tracker and updates
+        alignment, hold and exercise state, so frames must come through here
+        one at a time and in order.
+        """
+        timer = job['timer']
+        self.last_timer = timer
+        with timer.span('scoring'):
+            self._refresh_exercise()
+
+        # ====================================
+        # MEDIAPIPE POSE PROCESSING
+        # ====================================
+
+        # Run this session's tracker on the decoded frame (or decode the
+        # binary attachment / base64 data URL here if it wasn't yet);
+        # the image itself is only needed for drawing
+        want_image = job['response_mode'] != 'landmarks'
+        payload = job['prepared'] if job['prepared'] is not None else job['frame']['image']
+        now = time.time()
+        run_pose = self.skipper.should_infer(now) or self.frame_shape is None
+
+        if run_pose or want_image:
+            infer_start = time.perf_counter()
+            result = self.backend.infer(
+                self.sid, payload,
+                want_image=want_image, run_pose=run_pose
+            )
+            infer_time = time.perf_counter() - infer_start
+
+            if result.error is not None:
+                counter, reason = INFERENCE_FAILURES[result.error]
+                if result.error == 'decode':
+                    print("⚠️ Failed to decode image")
+                metrics.registry.increment(counter)
+                self._drop(job['frame'], reason)
+                return None
+
+            if result.timing:
+                for stage, seconds in result.timing.items():
+                    timer.add(stage, seconds)
+                timer.add('transfer', max(0.0, infer_time - sum(result.timing.values())))
+            else:
+                timer.add('inference', infer_time)
+        else:
+            # Skipped frame in landmarks mode: nothing to decode or draw on
+            result = inference.InferenceResult(None, self.frame_shape, None)
+        self.frame_shape = result.shape
+        scoring_start = time.perf_counter()
+
+        if run_pose:
+            landmarks = result.landmarks
+            self.skipper.record(landmarks, now)
+            if landmarks is None:
+                metrics.registry.increment('no_pose_frames')
+        else:
+            # Fill in from the recent trajectory instead of running the model
+            landmarks = self.skipper.predict(now)
+            metrics.registry.increment('skipped_inferences')
+
+        live_array = self.smoother(landmarks, now)
+        aspect_ratio = result.shape[1] / result.shape[0]
+
+        # calibration: cheap mtime check so an updated pose image is picked up
+        if self.status == STATUS_CALIBRATING:
+            self.saved_array = self.pose_cache.get(self.posefile, self.pipeline_config.model)
+
+        # Automatic alignment: closed-form fit of the saved pose onto the live pose
+        if self.auto_align and self.status == STATUS_CALIBRATING and self.saved_array is not None and live_array is not None:
+            self.offset_x, self.offset_y, self.scale, self.rotation = posefunctions.fit_similarity_transform(
+                self.saved_array, live_array,
+                allow_rotation=ALLOW_ROTATION,
+                aspect_ratio=aspect_ratio
+            )
+
+        # Apply offset and scale to the saved pose once per frame
+        adjusted_array = posefunctions.transform_landmarks(
+            self.saved_array, self.offset_x, self.offset_y, self.scale,
+            rotation=self.rotation, aspect_ratio=aspect_ratio
+        )
+
+        # Recognize which catalog exercise the live pose is closest to. Its
+        # shape_score is size-normalized, not comparable with accuracy
+        recognized = None
+        if self.catalog_stack is not None and live_array is not None:
+            catalog_scores, best_index = posefunctions.score_against_references(live_array, self.catalog_stack)
+            if best_index >= 0:
+                recognized = {
+                    'exercise': self.catalog_names[best_index],
+                    'shape_score': float(catalog_scores[best_index])
+                }
+
+        # Calculate accuracy score
+        accuracy = 0.0
+        scored = adjusted_array is not None and live_array is not None
+        if scored:
+            # Calculate similarity
+            accuracy = posefunctions.calculate_pose_similarity_wo_face(adjusted_array, live_array)
+            self._update_status(accuracy, now)
+
+        if self.recorder is not None and job['frame'].get('recorded_index') is not None:
+            self.recorder.record_result(job['frame']['recorded_index'], live_array, accuracy, now)
+
+        self.num_frames += 1
+        if self.num_frames > 99:
+            self.num_frames = 0
+        timer.add('scoring', time.perf_counter() - scoring_start)
+        # ====================================
+        # END PROCESSING
+        # ====================================
+
+        job.update({
+            'image': result.image,
+            'live': live_array,
+            'adjusted': adjusted_array,
+            'accuracy': accuracy,
+            'scored': scored,
+            'recognized': recognized,
+            'extrapolated': not run_pose
+        })
+        job['prepared'] = None
+        return job
+
+    def render_frame(self, job):
+        """
+        Draw and encode stage: only uses what analyze_frame stored in the
+        job, so it can run on any thread, behind the next frame's analysis.
+        """
+        timer = job['timer']
+        if job['response_mode'] == 'landmarks':
+            # Client already has the frame, so only ship the landmarks
+            response = {
+                'landmarks': {
+                    'live': frametransport.pack_landmarks(job['live']),
+                    'reference': frametransport.pack_landmarks(job['adjusted'])
+                }
+            }
+        else:
+            # Draw overlays and encode, replying in the same format the client sent
+            with timer.span('draw'):
+                display_frame = self.overlay.draw(job['image'], job['adjusted'], job['live'],
+                                                  job['accuracy'] if job['scored'] else None)
+            with timer.span('encode'):
+                response = {
+                    'image': frametransport.encode_frame(display_frame, binary=job['binary'])
+                }
+
+        response['accuracy'] = job['accuracy']
+        response['recognized'] = job['recognized']
+        response['extrapolated'] = job['extrapolated']
+        # Acknowledge the client's frame so it can send the next one
+        if job['frame'].get('seq') is not None:
+            response['ack'] = job['frame']['seq']
+        timer.finish()
+        self.skipper.observe(timer.spans['total'])
+        # Echo the capture time so the client can measure end-to-end latency
+        if job['frame'].get('captured_at') is not None:
+            response['captured_at'] = job['frame']['captured_at']
+            response['server_ms'] = round(timer.spans['total'] * 1000.0, 3)
+        if self.send_timing:
+            response['timing'] = timer.as_millis()
+
+        job['response'] = response
+        return job
+
+    def _update_status(self, accuracy, now):
+        # Non-blocking rest period after a completed hold
+        if now < self.rest_until:
+            return
+
+        if accuracy >= 80 and self.status == STATUS_CALIBRATING:
+            self.exercises.start_holding(self.exercise_id)
+            self.hold.reset()
+            self.pose_loaded = True
+        if self.status == STATUS_HOLDING:
+            self.scores.add(accuracy, now)
+            if self.hold.update(accuracy, now):
+                self.exercises.finish(self.exercise_id, self.scores.summary())
+                self.scores.reset()
+                self.hold.reset()
+                self.rest_until = now + REST_SECONDS
+                self.pose_loaded = False
@@ -0,0 +1,168 @@
+"""
+Replay a recorded session (see sessionrecord.py) into the Socket.IO server.
+
+Frames are sent at their original arrival rate, a multiple of it (--speed),
+or as fast as possible (--fast). With --lockstep only one frame is in flight
+at a time, which gives exact per-frame round-trip latency; otherwise the
+server sees the same open-loop load a real client produced.
+
+Frames are sent with a seq and captured_at like the browser client does,
+so the server's acks, flow control and stale-frame dropping apply. A
+frame_dropped reply counts as the answer to a frame. captured_at keeps the
+recorded spacing between captures (scaled by --speed), rebased to now.
+
+Usage:
+    python replaySession.py recordings/20250101-120000_abc --url http://localhost:5000
+    python replaySession.py recordings/20250101-120000_abc --fast --lockstep --repeat 5
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+import socketio
+
+from sessionrecord import read_frames
+
+
+class ReplayClient:
+    """Socket.IO client that sends numbered frames and timestamps the replies"""
+
+    def __init__(self, url, response_mode='image'):
+        self.sio = socketio.Client()
+        self.response_mode = response_mode
+        self.responses = []
+        # End-to-end latencies (s) from the echoed captured_at
+        self.echo_latencies = []
+        # Reason -> count of frames the server dropped without processing
+        self.dropped = {}
+        # Frames are numbered across repeats, so acks only ever go up
+        self.seq = 0
+        self.acked = 0
+        self._ack_condition = threading.Condition()
+        self.sio.on('processed_frame', self._on_processed_frame)
+        self.sio.on('frame_dropped', self._on_frame_dropped)
+        self.sio.connect(url, transports=['websocket'])
+        if response_mode != 'image':
+            self.sio.emit('set_response_mode', {'mode': response_mode})
+
+    def _ack(self, data):
+        with self._ack_condition:
+            # Servers without flow control don't ack, so count any reply
+            self.acked = max(self.acked, data.get('ack', self.seq))
+            self._ack_condition.notify_all()
+
+    def _on_processed_frame(self, data):
+        now = time.time()
+        self.responses.append(now)
+        if data.get('captured_at') is not None:
+            self.echo_latencies.append(now - data['captured_at'] / 1000.0)
+        self._ack(data)
+
+    def _on_frame_dropped(self, data):
+        reason = data.get('reason', 'unknown')
+        self.dropped[reason] = self.dropped.get(reason, 0) + 1
+        self._ack(data)
+
+    def send(self, payload, captured_at=None):
+        """Send a frame (captured_at in s since the epoch, default now); returns its seq"""
+        self.seq += 1
+        if captured_at is None:
+            captured_at = time.time()
+        self.sio.emit('frame', {'image': payload, 'seq': self.seq, 'captured_at': captured_at * 1000.0})
+        return self.seq
+
+    def wait_response(self, seq, timeout):
+        """Wait until frame seq was processed or dropped"""
+        with self._ack_condition:
+            return self._ack_condition.wait_for(lambda: self.acked >= seq, timeout)
+
+    def close(self):
+        self.sio.disconnect()
+
+
+def replay(client, frames, speed=1.0, fast=False, lockstep=False, timeout=5.0):
+    """
+    Send the frames once. Returns (sent, latencies) where latencies are
+    round trips in seconds (only measured with lockstep).
+    """
+    sent = 0
+    latencies = []
+    first_recorded = frames[0].timestamp if frames else 0.0
+    first_captured = frames[0].captured_at if frames else None
+    start = time.time()
+
+    for frame in frames:
+        if not fast:
+            due = start + (frame.timestamp - first_recorded) / speed
+            delay = due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+        sent_at = time.time()
+        captured_at = None
+        if not fast and first_captured is not None and frame.captured_at is not None:
+            # Recorded capture jitter, shifted to the replay's clock
+            captured_at = min(sent_at, start + (frame.captured_at - first_captured) / 1000.0 / speed)
+        seq = client.send(frame.payload, captured_at)
+        sent += 1
+
+        if lockstep:
+            if client.wait_response(seq, timeout):
+                latencies.append(time.time() - sent_at)
+            else:
+                print(f"⚠️  Warning: No response to frame {frame.index} within {timeout}s")
+
+    return sent, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session into the pose server")
+    parser.add_argument('recording', help="recording directory")
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--speed', type=float, default=1.0, help="multiple of the original frame rate")
+    parser.add_argument('--fast', action='store_true', help="send frames as fast as possible")
+    parser.add_argument('--lockstep', action='store_true', help="wait for each response before sending the next frame")
+    parser.add_argument('--repeat', type=int, default=1, help="number of times to play the recording")
+    parser.add_argument('--mode', choices=('image', 'landmarks'), default='image', help="response mode to request")
+    args = parser.parse_args()
+
+    frames = list(read_frames(args.recording))
+    if not frames:
+        print(f"❌ No frames in {args.recording}")
+        return 1
+
+    client = ReplayClient(args.url, args.mode)
+    start = time.time()
+    sent, latencies = 0, []
+    try:
+        for _ in range(args.repeat):
+            count, round_trips = replay(client, frames, args.speed, args.fast, args.lockstep)
+            sent += count
+            latencies.extend(round_trips)
+
+        # Let the last in-flight frames come back
+        time.sleep(1.0)
+    finally:
+        client.close()
+
+    elapsed = time.time() - start
+    received = len(client.responses)
+    print(f"Sent {sent} frames, received {received} responses in {elapsed:.2f}s")
+    print(f"Throughput: {received / elapsed:.1f} fps (dropped {sent - received})")
+    if client.dropped:
+        reasons = ', '.join(f"{reason} {count}" for reason, count in sorted(client.dropped.items()))
+        print(f"Dropped by the server: {reasons}")
+    if client.echo_latencies:
+        echo_ms = np.array(client.echo_latencies) * 1000.0
+        print(f"Capture to response: p50 {np.percentile(echo_ms, 50):.1f} ms, "
+              f"p99 {np.percentile(echo_ms, 99):.1f} ms")
+    if latencies:
+        latencies_ms = np.array(latencies) * 1000.0
+        print(f"Latency: p50 {np.percentile(latencies_ms, 50):.1f} ms, "
+              f"p99 {np.percentile(latencies_ms, 99):.1f} ms, max {latencies_ms.max():.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
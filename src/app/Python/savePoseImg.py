@@ -1,40 +1,44 @@
 import cv2
 import mediapipe as mp
 
+import pipelineconfig
+from capture import CameraCapture, InferenceThread, process_pose
+
 # Initialize MediaPipe Pose
 mp_pose = mp.solutions.pose
 mp_drawing = mp.solutions.drawing_utils
-pose = mp_pose.Pose(
-    min_detection_confidence=0.5,
-    min_tracking_confidence=0.5
-)
+# Model and thresholds come from the shared pipeline config ($POSE_PIPELINE_CONFIG)
+pose = pipelineconfig.create_pose(pipelineconfig.load_config())
 
-# Initialize the camera (0 is usually the default camera)
-cap = cv2.VideoCapture(0)
+# Initialize the camera (0 is usually the default camera); capture and
+# inference run on their own threads
+capture = CameraCapture(0)
 
 # Check if camera opened successfully
-if not cap.isOpened():
+if not capture.isOpened():
     print("Error: Could not open camera")
     exit()
 
+capture.start()
+inference = InferenceThread(capture.frames, process_pose(pose)).start()
+
 print("Camera feed started with pose detection!")
 print("Press 's' to save the current frame as 'savedPose.jpg' (without pose overlay)")
 print("Press 'q' to quit")
 
+result_seq = 0
 while True:
-    # Capture frame-by-frame
-    ret, frame = cap.read()
-    
-    # If frame is read correctly, ret is True
-    if not ret:
-        print("Error: Can't receive frame. Exiting...")
-        break
+    # Wait for the newest processed frame
+    result_seq, result = inference.results.get(result_seq, timeout=1.0)
     
-    # Convert the BGR image to RGB for MediaPipe
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    # Capture thread stopped if the camera stopped delivering frames
+    if result is None:
+        if inference.results.closed:
+            print("Error: Can't receive frame. Exiting...")
+            break
+        continue
     
-    # Process the frame with MediaPipe Pose
-    results = pose.process(rgb_frame)
+    frame, results = result
     
     # Create a copy of the frame for display with pose overlay
     display_frame = frame.copy()
@@ -65,7 +69,8 @@ while True:
         break
 
 # Release resources
-cap.release()
+inference.stop()
+capture.stop()
 cv2.destroyAllWindows()
 pose.close()
 print("Camera feed closed")
\ No newline at end of file
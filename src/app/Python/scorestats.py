@@ -0,0 +1,127 @@
+import math
+import time
+
+import numpy as np
+
+# Scores at or above this count as "in the zone" (same as the hold threshold)
+ZONE_THRESHOLD = 80.0
+
+# Scores are 0-100, so a fixed 0.5-point histogram is an exact-enough,
+# constant-size sketch for percentiles
+HISTOGRAM_BINS = 201
+HISTOGRAM_STEP = 0.5
+
+# Time-weighted samples: weight of the first sample, and the longest gap
+# one sample may stand for (a stall shouldn't dominate the mean)
+FIRST_SAMPLE_SECONDS = 1.0 / 30.0
+MAX_SAMPLE_SECONDS = 0.5
+
+
+class StreamingScoreStats:
+    """
+    Constant-memory statistics over a stream of 0-100 scores.
+
+    Tracks running mean and variance (Welford), min/max, a fixed-size
+    histogram for percentiles, and how long the score stayed at or above
+    ZONE_THRESHOLD. Samples can carry a weight; with time_weighted each
+    sample is weighted by the time since the previous one, so irregularly
+    spaced or skipped frames don't skew the mean.
+    """
+
+    def __init__(self, zone_threshold=ZONE_THRESHOLD, time_weighted=False):
+        self.zone_threshold = zone_threshold
+        self.time_weighted = time_weighted
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total_weight = 0.0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.histogram = np.zeros(HISTOGRAM_BINS, dtype=np.float64)
+        self.first_time = None
+        self.last_time = None
+        self.time_in_zone = 0.0
+
+    def add(self, score, timestamp=None, weight=None):
+        """Add one score sample"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        if weight is None:
+            if not self.time_weighted:
+                weight = 1.0
+            elif self.last_time is None:
+                weight = FIRST_SAMPLE_SECONDS
+            else:
+                weight = min(max(0.0, timestamp - self.last_time), MAX_SAMPLE_SECONDS)
+
+        if self.last_time is not None and score >= self.zone_threshold:
+            self.time_in_zone += max(0.0, timestamp - self.last_time)
+        if self.first_time is None:
+            self.first_time = timestamp
+        self.last_time = timestamp
+
+        if weight <= 0:
+            return
+
+        # Weighted Welford update
+        score = float(score)
+        self.count += 1
+        self.total_weight += weight
+        delta = score - self.mean
+        self.mean += delta * weight / self.total_weight
+        self._m2 += weight * delta * (score - self.mean)
+
+        self.min = min(self.min, score)
+        self.max = max(self.max, score)
+
+        index = int(round(min(max(score, 0.0), 100.0) / HISTOGRAM_STEP))
+        self.histogram[index] += weight
+
+    @property
+    def variance(self):
+        if self.total_weight <= 0:
+            return 0.0
+        return self._m2 / self.total_weight
+
+    @property
+    def std(self):
+        return math.sqrt(max(0.0, self.variance))
+
+    @property
+    def duration(self):
+        if self.first_time is None:
+            return 0.0
+        return self.last_time - self.first_time
+
+    def percentile(self, q):
+        """Approximate q-th percentile (0-100) from the histogram"""
+        if self.total_weight <= 0:
+            return 0.0
+
+        cumulative = np.cumsum(self.histogram)
+        index = int(np.searchsorted(cumulative, q / 100.0 * cumulative[-1]))
+        return min(index, HISTOGRAM_BINS - 1) * HISTOGRAM_STEP
+
+    def summary(self):
+        """Dict of all statistics, suitable for JSON"""
+        if self.count == 0:
+            return {'count': 0}
+
+        duration = self.duration
+        return {
+            'count': self.count,
+            'mean': round(self.mean, 2),
+            'std': round(self.std, 2),
+            'min': round(self.min, 2),
+            'max': round(self.max, 2),
+            'p10': self.percentile(10),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'duration': round(duration, 2),
+            'time_in_zone': round(self.time_in_zone, 2),
+            'zone_fraction': round(self.time_in_zone / duration, 3) if duration > 0 else 0.0
+        }
@@ -0,0 +1,121 @@
+"""
+Recording of live client sessions for replay and load testing.
+
+A recording is a directory holding:
+
+    frames.bin       every frame the client sent, as <arrival time f64>
+                     <kind u8><length u32><seq i64><captured_at f64><payload>
+                     records (kind 0 = binary image, 1 = base64 data URL;
+                     seq -1 and captured_at NaN when the client didn't send
+                     them)
+    landmarks.traj   live landmarks of every processed frame (trajectory.py)
+    results.csv      one row per processed frame: frame (index in frames.bin),
+                     timestamp (wall-clock time it was scored), accuracy,
+                     has_pose (0/1)
+
+Frames are recorded on arrival, so frames the server later drops are still
+in the recording and a replay reproduces the same load.
+"""
+import csv
+import math
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+
+import trajectory
+
+RECORD_HEADER = struct.Struct('<dBIqd')
+KIND_BINARY = 0
+KIND_DATA_URL = 1
+
+# seq and captured_at (client ms since the epoch) are None if not sent
+RecordedFrame = namedtuple('RecordedFrame', ['index', 'timestamp', 'payload', 'seq', 'captured_at'])
+
+
+class SessionRecorder:
+    """
+    Opt-in recorder for one session. record_frame() is called as frames
+    arrive and record_result() after each one is processed.
+    """
+
+    def __init__(self, directory, fps=30.0, source=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.frames = 0
+
+        self._frames_file = open(os.path.join(directory, 'frames.bin'), 'wb')
+        self._landmarks = trajectory.TrajectoryWriter(
+            os.path.join(directory, 'landmarks.traj'), fps, source=source
+        )
+        self._results_file = open(os.path.join(directory, 'results.csv'), 'w', newline='')
+        self._results = csv.writer(self._results_file)
+        self._results.writerow(['frame', 'timestamp', 'accuracy', 'has_pose'])
+
+    def record_frame(self, payload, timestamp=None, seq=None, captured_at=None):
+        """Append an incoming frame payload; returns its index in the recording"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        if isinstance(payload, str):
+            kind, data = KIND_DATA_URL, payload.encode('utf-8')
+        else:
+            kind, data = KIND_BINARY, bytes(payload)
+
+        with self._lock:
+            if self._frames_file is None:
+                return None
+            index = self.frames
+            self._frames_file.write(RECORD_HEADER.pack(
+                timestamp, kind, len(data),
+                -1 if seq is None else seq,
+                math.nan if captured_at is None else captured_at
+            ))
+            self._frames_file.write(data)
+            self.frames += 1
+            return index
+
+    def record_result(self, frame_index, landmarks, accuracy, timestamp=None):
+        """Append the outcome of processing one recorded frame"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            if self._results_file is None:
+                return
+            self._landmarks.append(landmarks)
+            self._results.writerow([
+                frame_index, f'{timestamp:.6f}', f'{accuracy:.3f}', int(landmarks is not None)
+            ])
+
+    def close(self):
+        with self._lock:
+            if self._frames_file is None:
+                return
+            self._frames_file.close()
+            self._frames_file = None
+            self._landmarks.close()
+            self._results_file.close()
+            self._results_file = None
+
+
+def read_frames(directory):
+    """Yield the RecordedFrames of a recording in arrival order"""
+    with open(os.path.join(directory, 'frames.bin'), 'rb') as f:
+        index = 0
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, kind, length, seq, captured_at = RECORD_HEADER.unpack(header)
+            seq = None if seq < 0 else seq
+            captured_at = None if math.isnan(captured_at) else captured_at
+            data = f.read(length)
+            if len(data) < length:
+                # Recording was cut off mid-frame
+                return
+            payload = data.decode('utf-8') if kind == KIND_DATA_URL else data
+            yield RecordedFrame(index, timestamp, payload, seq, captured_at)
+            index += 1
@@ -0,0 +1,153 @@
+"""
+Ordered multi-stage processing pipeline.
+
+Work items flow through a list of stages, each with its own thread(s),
+connected by bounded buffers. Consecutive items overlap (item N+1 can be in
+the first stage while N is in the second and N-1 in the third), so
+throughput approaches the slowest stage instead of the sum of all stages.
+Every buffer releases items in submission order, so a single-threaded stage
+always sees items in order and the output callback is called in order even
+when a stage runs several threads.
+"""
+import threading
+
+
+class OrderedBuffer:
+    """
+    Bounded hand-off that releases items strictly by sequence number.
+
+    put() blocks while the item is more than capacity ahead of the next
+    one to be released, so the item that is being waited for can always
+    get in and the pipeline can't deadlock.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self._items = {}
+        self._next = 0
+        self._condition = threading.Condition()
+        self.closed = False
+
+    def put(self, seq, item):
+        with self._condition:
+            self._condition.wait_for(lambda: seq < self._next + self.capacity or self.closed)
+            if self.closed:
+                return
+            self._items[seq] = item
+            self._condition.notify_all()
+
+    def get(self):
+        """Next (seq, item) in order; (None, None) once closed"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._next in self._items or self.closed)
+            if self._next not in self._items:
+                return None, None
+            seq = self._next
+            item = self._items.pop(seq)
+            self._next += 1
+            self._condition.notify_all()
+            return seq, item
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._items.clear()
+            self._condition.notify_all()
+
+
+class StagedPipeline:
+    """
+    Runs items through stages = [(name, func, num_threads), ...] and calls
+    on_output(result) in submission order.
+
+    A stage returning None drops the item: later stages skip it but its
+    sequence number still passes through, so ordering is kept. A stage
+    that raises drops the item the same way and calls on_error(item, error)
+    with the stage's input. The input is a single latest-item slot:
+    submitting while an item is still waiting replaces it (latest frame
+    wins). buffer_size bounds each hand-off between stages.
+    """
+
+    def __init__(self, stages, on_output, buffer_size=2, name='Pipeline', on_error=None):
+        self.stages = stages
+        self.on_output = on_output
+        self.on_error = on_error
+        self.name = name
+        # Newest submitted item not yet taken by the first stage
+        self._latest = None
+        self._input_condition = threading.Condition()
+        self._next_seq = 0
+        self._buffers = [OrderedBuffer(buffer_size) for _ in stages]
+        self._running = True
+        self._threads = []
+
+        for index, (stage_name, func, num_threads) in enumerate(stages):
+            for i in range(max(1, num_threads)):
+                thread = threading.Thread(
+                    target=self._run_stage, args=(index, func),
+                    daemon=True, name=f"{name}-{stage_name}-{i}"
+                )
+                thread.start()
+                self._threads.append(thread)
+
+        thread = threading.Thread(target=self._run_output, daemon=True, name=f"{name}-output")
+        thread.start()
+        self._threads.append(thread)
+
+    def submit(self, item):
+        """Queue an item; returns the older waiting item dropped for it, or None"""
+        with self._input_condition:
+            dropped, self._latest = self._latest, item
+            self._input_condition.notify()
+        return dropped
+
+    def _take_input(self):
+        with self._input_condition:
+            self._input_condition.wait_for(lambda: self._latest is not None or not self._running)
+            if not self._running:
+                return None, None
+            # Sequence numbers are assigned here so dropped inputs leave no gaps
+            seq = self._next_seq
+            self._next_seq += 1
+            item, self._latest = self._latest, None
+            return seq, item
+
+    def _run_stage(self, index, func):
+        while self._running:
+            if index == 0:
+                seq, item = self._take_input()
+            else:
+                seq, item = self._buffers[index - 1].get()
+            if seq is None:
+                break
+
+            result = None
+            if item is not None:
+                try:
+                    result = func(item)
+                except Exception as e:
+                    print(f"❌ Error in {self.name} stage {self.stages[index][0]}: {str(e)}")
+                    import traceback
+                    traceback.print_exc()
+                    if self.on_error is not None:
+                        self.on_error(item, e)
+            self._buffers[index].put(seq, result)
+
+    def _run_output(self):
+        while self._running:
+            seq, result = self._buffers[-1].get()
+            if seq is None:
+                break
+            if result is not None:
+                try:
+                    self.on_output(result)
+                except Exception as e:
+                    print(f"❌ Error in {self.name} output: {str(e)}")
+
+    def close(self):
+        self._running = False
+        with self._input_condition:
+            self._latest = None
+            self._input_condition.notify_all()
+        for buffer in self._buffers:
+            buffer.close()
@@ -0,0 +1,141 @@
+"""
+Compact on-disk landmark trajectories.
+
+A .traj file is a fixed-size JSON header followed by a raw C-order
+(frames, 33, 4) array of float16 or float32 landmarks (x, y, z, visibility).
+Frames without a detected pose are stored as NaN. Because the array starts
+at a fixed offset it can be opened with np.memmap, so hours of recordings
+can be replayed or re-scored without MediaPipe and without loading them
+into RAM.
+"""
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+import posefunctions
+
+MAGIC = b'YVTRAJ1\n'
+# Header is padded to a fixed size so a writer can fill in the frame count
+# afterwards and the landmark data stays page aligned
+HEADER_BYTES = 4096
+FRAME_SHAPE = (posefunctions.NUM_LANDMARKS, 4)
+DEFAULT_DTYPE = np.float16
+
+Trajectory = namedtuple('Trajectory', ['landmarks', 'fps', 'source', 'exercise', 'metadata'])
+
+
+def _encode_header(header):
+    body = json.dumps(header).encode('utf-8')
+    if len(MAGIC) + len(body) + 1 > HEADER_BYTES:
+        raise ValueError("Trajectory header too large")
+    return MAGIC + body + b'\n' + b' ' * (HEADER_BYTES - len(MAGIC) - len(body) - 1)
+
+
+def _decode_header(raw, path):
+    if not raw.startswith(MAGIC):
+        raise ValueError(f"{path} is not a trajectory file")
+    return json.loads(raw[len(MAGIC):].decode('utf-8'))
+
+
+class TrajectoryWriter:
+    """
+    Streams landmark frames to a .traj file, one frame at a time.
+
+    Usable as a context manager. Frames go straight to disk, so a long
+    recording never accumulates in memory. The header's frame count is
+    written on close(), and readers fall back to the file size if the
+    writer never got there.
+    """
+
+    def __init__(self, path, fps, source=None, exercise=None, dtype=DEFAULT_DTYPE, **metadata):
+        self.path = path
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.header = {
+            'version': 1,
+            'dtype': self.dtype.str,
+            'shape': list(FRAME_SHAPE),
+            'frames': 0,
+            'fps': float(fps),
+            'source': source,
+            'exercise': exercise,
+            'metadata': metadata
+        }
+        self.frames = 0
+        self._empty = np.full(FRAME_SHAPE, np.nan, dtype=self.dtype)
+        self._file = open(path, 'wb')
+        self._file.write(_encode_header(self.header))
+
+    def append(self, landmarks):
+        """Write one (33, 4) frame; None records a frame without a pose"""
+        if landmarks is None:
+            frame = self._empty
+        else:
+            frame = np.asarray(landmarks, dtype=self.dtype).reshape(FRAME_SHAPE)
+        self._file.write(np.ascontiguousarray(frame).tobytes())
+        self.frames += 1
+
+    def extend(self, landmarks):
+        """Write a (frames, 33, 4) block of frames"""
+        block = np.asarray(landmarks, dtype=self.dtype).reshape((-1,) + FRAME_SHAPE)
+        self._file.write(np.ascontiguousarray(block).tobytes())
+        self.frames += len(block)
+
+    def close(self):
+        if self._file is None:
+            return
+        self.header['frames'] = self.frames
+        self._file.seek(0)
+        self._file.write(_encode_header(self.header))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_trajectory(path, landmarks, fps, source=None, exercise=None, dtype=DEFAULT_DTYPE, **metadata):
+    """Write a whole (frames, 33, 4) array at once"""
+    with TrajectoryWriter(path, fps, source, exercise, dtype, **metadata) as writer:
+        writer.extend(landmarks)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        return _decode_header(f.read(HEADER_BYTES), path)
+
+
+def open_trajectory(path, mode='r'):
+    """
+    Open a .traj file without reading its landmark data.
+
+    Returns a Trajectory whose landmarks field is a (frames, 33, 4)
+    np.memmap; slices of it are only paged in when touched.
+    """
+    header = read_header(path)
+    dtype = np.dtype(header['dtype'])
+    shape = tuple(header['shape'])
+    frame_bytes = dtype.itemsize * int(np.prod(shape))
+
+    # Trust the file size over the header so an interrupted recording
+    # is still readable up to its last complete frame
+    frames = (os.path.getsize(path) - HEADER_BYTES) // frame_bytes
+    if frames > 0:
+        landmarks = np.memmap(path, dtype=dtype, mode=mode, offset=HEADER_BYTES, shape=(frames,) + shape)
+    else:
+        landmarks = np.zeros((0,) + shape, dtype=dtype)
+
+    return Trajectory(landmarks, header['fps'], header.get('source'),
+                      header.get('exercise'), header.get('metadata', {}))
+
+
+def frame_array(trajectory, index):
+    """(33, 4) float32 landmarks for one frame, or None if no pose was recorded"""
+    frame = np.array(trajectory.landmarks[index], dtype=np.float32)
+    if np.isnan(frame).any():
+        return None
+    return frame
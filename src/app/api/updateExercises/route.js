@@ -1,6 +1,8 @@
 import { NextResponse } from 'next/server';
 import { query } from '../../lib/db';
 
+const POSE_SERVER_NOTIFY_URL = 'http://localhost:5000/exercises/changed';
+
 export async function POST(request) {
   try {
     const { exercises } = await request.json();
@@ -23,6 +25,13 @@ export async function POST(request) {
     
     const result = await query(sql, exercises);
     
+    // Tell the pose server to reload the active exercise instead of polling for it
+    try {
+      await fetch(POSE_SERVER_NOTIFY_URL, { method: 'POST' });
+    } catch (notifyErr) {
+      console.error('Could not notify pose server:', notifyErr.message);
+    }
+    
     return NextResponse.json({ 
       message: "Exercises updated", 
       affectedRows: result.affectedRows 
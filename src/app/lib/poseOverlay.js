@@ -0,0 +1,58 @@
+// Same edges as mediapipe's mp_pose.POSE_CONNECTIONS
+export const POSE_CONNECTIONS = [
+  [0, 1], [1, 2], [2, 3], [3, 7], [0, 4], [4, 5], [5, 6], [6, 8], [9, 10],
+  [11, 12], [11, 13], [13, 15], [15, 17], [15, 19], [15, 21], [17, 19],
+  [12, 14], [14, 16], [16, 18], [16, 20], [16, 22], [18, 20],
+  [11, 23], [12, 24], [23, 24], [23, 25], [24, 26], [25, 27], [26, 28],
+  [27, 29], [28, 30], [29, 31], [30, 32], [27, 31], [28, 32],
+];
+
+// Same cutoff the server (and mp_drawing) uses for hiding landmarks
+const VISIBILITY_THRESHOLD = 0.5;
+
+// Landmark i is drawn if it is visible enough and inside the frame
+function isVisible(lm, i) {
+  const x = lm[i * 4];
+  const y = lm[i * 4 + 1];
+  return lm[i * 4 + 3] >= VISIBILITY_THRESHOLD && x >= 0 && x <= 1 && y >= 0 && y <= 1;
+}
+
+// Draw landmarks sent by the server in landmarks-only mode.
+// `buffer` holds float32 x, y, z, visibility for each of the 33 landmarks.
+export function drawPose(context, buffer, color, width, height) {
+  if (!buffer) return;
+
+  const lm = new Float32Array(buffer);
+  context.strokeStyle = color;
+  context.fillStyle = color;
+  context.lineWidth = 2;
+
+  // Limbs: only connections with both ends visible
+  context.beginPath();
+  for (const [a, b] of POSE_CONNECTIONS) {
+    if (!isVisible(lm, a) || !isVisible(lm, b)) continue;
+    context.moveTo(lm[a * 4] * width, lm[a * 4 + 1] * height);
+    context.lineTo(lm[b * 4] * width, lm[b * 4 + 1] * height);
+  }
+  context.stroke();
+
+  for (let i = 0; i < lm.length / 4; i++) {
+    if (!isVisible(lm, i)) continue;
+    context.beginPath();
+    context.arc(lm[i * 4] * width, lm[i * 4 + 1] * height, 2, 0, 2 * Math.PI);
+    context.fill();
+  }
+}
+
+// Match score with the same color coding as the server's overlay
+export function drawScore(context, accuracy) {
+  if (accuracy >= 80) {
+    context.fillStyle = 'rgb(0, 255, 0)';
+  } else if (accuracy >= 60) {
+    context.fillStyle = 'rgb(255, 255, 0)';
+  } else {
+    context.fillStyle = 'rgb(255, 0, 0)';
+  }
+  context.font = 'bold 20px sans-serif';
+  context.fillText(`Match: ${accuracy.toFixed(1)}%`, 10, 30);
+}
@@ -2,17 +2,36 @@
 
 import { useRef, useState, useEffect } from 'react';
 import { io } from 'socket.io-client';
+import { drawPose, drawScore } from '../lib/poseOverlay';
+
+// Ask the server for landmarks only and draw the overlay here instead of
+// receiving a re-encoded JPEG for every frame
+const LANDMARKS_ONLY = false;
+
+// If the server drops a frame without answering, it is never acked; stop
+// waiting for it after this long so the stream can't stall
+const ACK_TIMEOUT_MS = 1000;
 
 export default function VideoProcessor() {
   const videoRef = useRef(null);
   const canvasRef = useRef(null);
+  const overlayRef = useRef(null);
   const socketRef = useRef(null);
   const [processedImage, setProcessedImage] = useState('');
   const [fps, setFps] = useState(0);
+  // Capture -> processed frame back on screen, and the server's share of it
+  const [latency, setLatency] = useState(null);
   const [connected, setConnected] = useState(false);
   const [cameraReady, setCameraReady] = useState(false);
   const lastFrameTime = useRef(Date.now());
   const frameCount = useRef(0);
+  const processedUrl = useRef(null);
+  // Flow control: the server grants a window of frames we may have in flight
+  // and acks each processed frame by seq, so we only send as fast as it keeps up
+  const frameWindow = useRef(1);
+  const sentSeq = useRef(0);
+  const ackedSeq = useRef(0);
+  const waitingSince = useRef(0);
 
   useEffect(() => {
     startCamera();
@@ -25,6 +44,9 @@ export default function VideoProcessor() {
       if (videoRef.current && videoRef.current.srcObject) {
         videoRef.current.srcObject.getTracks().forEach(track => track.stop());
       }
+      if (processedUrl.current) {
+        URL.revokeObjectURL(processedUrl.current);
+      }
     };
   }, []);
 
@@ -36,7 +58,13 @@ export default function VideoProcessor() {
     
     socketRef.current.on('connect', () => {
       console.log('Connected to WebSocket server');
+      // New server session, so nothing of ours is in flight any more
+      sentSeq.current = 0;
+      ackedSeq.current = 0;
       setConnected(true);
+      if (LANDMARKS_ONLY) {
+        socketRef.current.emit('set_response_mode', { mode: 'landmarks' });
+      }
     });
 
     socketRef.current.on('disconnect', () => {
@@ -44,8 +72,38 @@ export default function VideoProcessor() {
       setConnected(false);
     });
     
+    socketRef.current.on('flow_control', (data) => {
+      frameWindow.current = Math.max(1, data.window);
+    });
+    
+    socketRef.current.on('frame_dropped', (data) => {
+      // Too old by the time the server got to it; the credit comes back
+      if (data.ack !== undefined) {
+        ackedSeq.current = Math.max(ackedSeq.current, data.ack);
+        waitingSince.current = Date.now();
+      }
+    });
+    
     socketRef.current.on('processed_frame', (data) => {
-      setProcessedImage(data.image);
+      if (data.ack !== undefined) {
+        ackedSeq.current = Math.max(ackedSeq.current, data.ack);
+        waitingSince.current = Date.now();
+      }
+
+      if (data.landmarks) {
+        drawLandmarks(data.landmarks, data.accuracy);
+      } else if (typeof data.image === 'string') {
+        // base64 data URL fallback
+        setProcessedImage(data.image);
+      } else {
+        // Binary JPEG attachment
+        const url = URL.createObjectURL(new Blob([data.image], { type: 'image/jpeg' }));
+        if (processedUrl.current) {
+          URL.revokeObjectURL(processedUrl.current);
+        }
+        processedUrl.current = url;
+        setProcessedImage(url);
+      }
       
       // Calculate FPS
       frameCount.current++;
@@ -55,6 +113,9 @@ export default function VideoProcessor() {
         const timeDiff = now - lastFrameTime.current;
         setFps(Math.round(5000 / timeDiff));
         lastFrameTime.current = now;
+        if (data.captured_at !== undefined) {
+          setLatency({ total: now - data.captured_at, server: Math.round(data.server_ms) });
+        }
       }
     });
 
@@ -67,6 +128,21 @@ export default function VideoProcessor() {
     });
   };
 
+  const drawLandmarks = (landmarks, accuracy) => {
+    const overlay = overlayRef.current;
+    const video = videoRef.current;
+    if (!overlay || !video) return;
+
+    const context = overlay.getContext('2d');
+    context.drawImage(video, 0, 0, overlay.width, overlay.height);
+    drawPose(context, landmarks.reference, 'rgb(255, 0, 0)', overlay.width, overlay.height);
+    drawPose(context, landmarks.live, 'rgb(0, 255, 0)', overlay.width, overlay.height);
+    // The server only scores frames with both poses
+    if (landmarks.reference && landmarks.live) {
+      drawScore(context, accuracy);
+    }
+  };
+
   const startCamera = async () => {
     try {
       const stream = await navigator.mediaDevices.getUserMedia({
@@ -102,6 +178,20 @@ export default function VideoProcessor() {
       return;
     }
 
+    // Out of credits: wait for the server to ack a frame
+    const inFlight = sentSeq.current - ackedSeq.current;
+    if (inFlight >= frameWindow.current) {
+      if (Date.now() - waitingSince.current < ACK_TIMEOUT_MS) {
+        return;
+      }
+      ackedSeq.current = sentSeq.current;
+    }
+    if (sentSeq.current === ackedSeq.current) {
+      waitingSince.current = Date.now();
+    }
+    const seq = ++sentSeq.current;
+    const capturedAt = Date.now();
+
     // Set canvas to match video size
     canvas.width = 320;
     canvas.height = 240;
@@ -109,11 +199,13 @@ export default function VideoProcessor() {
     // Draw current frame
     context.drawImage(video, 0, 0, 320, 240);
 
-    // Convert to base64 with lower quality for speed
-    const imageData = canvas.toDataURL('image/jpeg', 0.5);
-    
-    // Send via WebSocket
-    socketRef.current.emit('frame', { image: imageData });
+    // Encode as JPEG with lower quality for speed and send the raw bytes
+    // as a binary attachment (no base64 overhead)
+    canvas.toBlob(async (blob) => {
+      if (!blob || !socketRef.current) return;
+      const imageData = await blob.arrayBuffer();
+      socketRef.current.emit('frame', { image: imageData, seq, captured_at: capturedAt });
+    }, 'image/jpeg', 0.5);
   };
 
   // Continuously send frames
@@ -157,6 +249,15 @@ export default function VideoProcessor() {
             <div className="text-white">
               <span className="font-semibold">{fps}</span> FPS
             </div>
+            {latency && (
+              <>
+                <div className="text-gray-400">|</div>
+                <div className="text-white">
+                  <span className="font-semibold">{latency.total}</span> ms
+                  <span className="text-gray-400"> ({latency.server} ms server)</span>
+                </div>
+              </>
+            )}
           </div>
         </div>
 
@@ -184,7 +285,14 @@ export default function VideoProcessor() {
               <h2 className="text-lg font-semibold text-white">Processed Output</h2>
             </div>
             <div className="aspect-video bg-black flex items-center justify-center">
-              {processedImage ? (
+              {LANDMARKS_ONLY ? (
+                <canvas
+                  ref={overlayRef}
+                  width={320}
+                  height={240}
+                  className="w-full h-full object-contain"
+                />
+              ) : processedImage ? (
                 <img
                   src={processedImage}
                   alt="Processed"